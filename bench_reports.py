@@ -0,0 +1,103 @@
+# Report latency benchmark: the original per-report loops vs the single-pass
+# Python scan vs the NumPy columnar layer, at 10k, 100k and 1M order lines.
+# Usage: python bench_reports.py [lines ...]
+
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from canteen import (
+    DEFAULT_INVENTORY, RECIPE_MAP, OrderArchive, OrderLineColumns, RecipeBook,
+    ReportAggregates, np
+)
+
+LINES_PER_ORDER = 3
+MENU = [(1, "Cheeseburger", 5.99), (2, "French Fries", 2.99), (3, "Soda", 1.99),
+        (4, "Pizza Slice", 3.99), (5, "Salad", 4.99)]
+
+
+def make_orders(lines):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, 8)
+    orders = []
+    for order_id in range(1, lines // LINES_PER_ORDER + 1):
+        when = start + timedelta(minutes=order_id * 2)
+        items = []
+        for menu_id, name, price in rng.sample(MENU, LINES_PER_ORDER):
+            qty = rng.randint(1, 4)
+            items.append({"id": menu_id, "name": name, "price": price, "quantity": qty, "total": qty * price})
+        orders.append({"id": order_id, "datetime": when.strftime("%Y-%m-%d %H:%M:%S"), "items": items,
+                       "total": sum(item["total"] for item in items), "status": "Completed"})
+    return orders
+
+
+def legacy_reports(orders, inventory):
+    """The loops the report tabs used to run, one pass per report"""
+    sales_by_day = {}
+    for order in orders:
+        dt = order.get("datetime", "")[:10]
+        sales_by_day.setdefault(dt, 0)
+        sales_by_day[dt] += order.get("total", 0)
+    item_sales = {}
+    for order in orders:
+        for item in order.get("items", []):
+            item_sales.setdefault(item["name"], 0)
+            item_sales[item["name"]] += item["quantity"]
+    used = {}
+    for order in orders:
+        for item in order.get("items", []):
+            for inv_name, qty_per in RECIPE_MAP.get(item["id"], {}).items():
+                used.setdefault(inv_name, 0)
+                used[inv_name] += qty_per * item["quantity"]
+    total_cost = 0
+    for order in orders:
+        for item in order.get("items", []):
+            for inv_name, qty_per in RECIPE_MAP.get(item["id"], {}).items():
+                inv_item = next((x for x in inventory if x["name"] == inv_name), None)
+                if inv_item:
+                    total_cost += qty_per * item["quantity"] * inv_item.get("supplier_price", 0)
+    hour_counts = {}
+    for order in orders:
+        try:
+            hour = datetime.strptime(order.get("datetime", ""), "%Y-%m-%d %H:%M:%S").strftime("%H")
+        except Exception:
+            continue
+        hour_counts.setdefault(hour, 0)
+        hour_counts[hour] += 1
+    return sales_by_day, item_sales, used, total_cost, hour_counts
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'lines':>9} {'legacy loops':>13} {'python scan':>12} {'numpy':>9}")
+    for lines in sizes:
+        orders = make_orders(lines)
+        with tempfile.TemporaryDirectory() as directory:
+            archive = OrderArchive(directory)
+            by_month = {}
+            for order in orders:
+                by_month.setdefault(order["datetime"][:7], []).append(order)
+            for month, month_orders in by_month.items():
+                archive.seal(month, month_orders)
+            legacy = timed(legacy_reports, orders, DEFAULT_INVENTORY)
+            book = RecipeBook()
+            book.seed()
+            recipes = book.compile(DEFAULT_INVENTORY)
+            scan = timed(ReportAggregates.scan, [], archive, DEFAULT_INVENTORY, recipes)
+            if np is not None:
+                vectorized = f"{timed(lambda: OrderLineColumns([], archive).aggregates(DEFAULT_INVENTORY, recipes)):8.3f}s"
+            else:
+                vectorized = "      n/a"
+            archive.close()
+        print(f"{lines:>9} {legacy:12.3f}s {scan:11.3f}s {vectorized}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -6,18 +6,44 @@ from ttkbootstrap.constants import *
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime, timedelta
+import array
+import bisect
+import calendar
+import contextlib
+import copy
 import json
+import math
+import mmap
 import os
+import re
+import shutil
+import sqlite3
 import matplotlib
 matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image, LongTable
+from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet
 import tempfile
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import csv
+import gzip
+import io
+import itertools
+import multiprocessing
 
+try:
+    import numpy as np
+except ImportError:  # optional: full report rescans fall back to pure Python loops
+    np = None
+
+MENU_FIELDS = ["id", "name", "price", "category", "available"]
 INVENTORY_FIELDS = [
     "id", "name", "category", "unit", "quantity", "threshold", "last_restock",
     "expiry_date", "supplier_name", "supplier_contact", "supplier_price",
@@ -120,20 +146,2803 @@ RECIPE_MAP = {
     5: {"Lettuce": 0.1}                  # Salad
 }
 
-class AnimatedButton(tb.Button):
-    """Button with hover animation"""
-    def __init__(self, *args, **kwargs):
-        self.default_bg = kwargs.get("bootstyle", "primary")
-        super().__init__(*args, **kwargs)
-        self.default_fg = "white" if self.default_bg in ["primary", "secondary", "success", "info", "warning", "danger"] else "black"
-        self.bind("<Enter>", self.on_enter)
-        self.bind("<Leave>", self.on_leave)
-        
-    def on_enter(self, e):
-        self.configure(bootstyle=f"{self.default_bg}-outline")
-        
-    def on_leave(self, e):
-        self.configure(bootstyle=self.default_bg)
+JOURNAL_COMPACT_EVERY = 500  # journaled orders before folding them into the snapshot
+
+
+def atomic_write_json(filename, data):
+    """Write JSON to a temp file next to `filename`, fsync it, then rename over it"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, filename)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class OrderJournal:
+    """Append-only order log (one JSON record per line) on top of a snapshot file.
+
+    Checkout appends a single line, so its cost does not depend on the size of the
+    order history. Every `compact_every` appends the journal is folded into the
+    snapshot and truncated.
+    """
+    def __init__(self, snapshot_path, journal_path=None, compact_every=JOURNAL_COMPACT_EVERY, fsync=True):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.pending = 0
+        self._file = None
+
+    def load(self, default_data=None):
+        """Rebuild the order list from the snapshot plus a replay of the journal"""
+        orders = list(default_data or [])
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r") as file:
+                    orders = json.load(file)
+            except Exception:
+                pass
+        seen = {order.get("id") for order in orders}
+        self.pending = 0
+        if not os.path.exists(self.journal_path):
+            return orders
+        good_offset = 0
+        with open(self.journal_path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # torn tail: the process died mid-append
+                try:
+                    order = json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                self.pending += 1
+                # A crash between snapshot rename and journal truncation leaves
+                # orders in both places; the snapshot copy wins.
+                if order.get("id") in seen:
+                    continue
+                seen.add(order.get("id"))
+                orders.append(order)
+        if good_offset < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(good_offset)
+        return orders
+
+    def append(self, order):
+        if self._file is None:
+            self._file = open(self.journal_path, "ab")
+        self._file.write(json.dumps(order, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.pending += 1
+
+    def maybe_compact(self, orders):
+        if self.pending >= self.compact_every:
+            self.compact(orders)
+
+    def compact(self, orders):
+        """Write `orders` as the new snapshot and start an empty journal"""
+        atomic_write_json(self.snapshot_path, orders)
+        self.close()
+        with open(self.journal_path, "wb") as file:
+            if self.fsync:
+                os.fsync(file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# --- Storage backends ---
+# Both backends expose the same small interface: load(dataset, default_data),
+# upsert(dataset, record), delete(dataset, record_id), append_order(order),
+# commit() and close(). Datasets are "menu", "inventory" and "orders".
+
+STORAGE_BACKEND = os.environ.get("CANTEEN_STORAGE", "json")  # "json" or "sqlite"
+SQLITE_DB = "canteen.db"
+PERSIST_WINDOW = 0.5  # seconds the write-behind thread waits to coalesce a burst of edits
+PERSIST_RETRY_MAX = 30  # seconds between retries once writes keep failing (the delay doubles up to this)
+PERSIST_CHECK_MS = 1000  # how often the Tk loop looks for write failures to report
+ROLLUPS_FILE = "rollups.json"
+REPORT_WORKERS = 2   # threads computing reports, dashboard stats and exports off the Tk thread
+TASK_POLL_MS = 50    # how often the Tk loop checks for finished background work
+
+
+class JsonStore:
+    """Keeps menu and inventory in JSON files and orders in an OrderJournal"""
+    files = {"menu": "menu.json", "inventory": "inventory.json", "orders": "orders.json"}
+
+    def __init__(self, files=None):
+        self.files = dict(self.files, **(files or {}))
+        self.order_journal = OrderJournal(self.files["orders"])
+        self._records = {}
+        self._dirty = set()
+
+    def load(self, dataset, default_data):
+        if dataset == "orders":
+            records = self.order_journal.load(default_data)
+        else:
+            records = default_data
+            filename = self.files[dataset]
+            if os.path.exists(filename):
+                try:
+                    with open(filename, "r") as file:
+                        records = json.load(file)
+                except Exception:
+                    records = default_data
+        # Keep private copies so the files can be written from another thread
+        # while the UI keeps editing its own dicts.
+        self._records[dataset] = {record.get("id"): dict(record) for record in records}
+        if dataset == "orders":
+            self.order_journal.maybe_compact(list(self._records["orders"].values()))
+        return records
+
+    def upsert(self, dataset, record):
+        self._records.setdefault(dataset, {})[record.get("id")] = record
+        self._dirty.add(dataset)
+
+    def delete(self, dataset, record_id):
+        self._records.setdefault(dataset, {}).pop(record_id, None)
+        self._dirty.add(dataset)
+
+    def append_order(self, order):
+        self._records.setdefault("orders", {})[order.get("id")] = order
+        self.order_journal.append(order)
+
+    def commit(self):
+        for dataset in sorted(self._dirty):
+            records = list(self._records[dataset].values())
+            if dataset == "orders":
+                self.order_journal.compact(records)
+            else:
+                atomic_write_json(self.files[dataset], records)
+        self._dirty.clear()
+        if self.order_journal.pending >= self.order_journal.compact_every:
+            self.order_journal.compact(list(self._records["orders"].values()))
+
+    def rollback(self):
+        # Nothing reaches disk before commit() except journaled orders, which are
+        # already durable on their own.
+        self._dirty.clear()
+
+    def close(self):
+        self.order_journal.close()
+
+
+class SQLiteStore:
+    """Normalized SQLite storage; every commit() is one transaction"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price REAL NOT NULL DEFAULT 0,
+            category TEXT,
+            available INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            category TEXT,
+            unit TEXT,
+            quantity REAL NOT NULL DEFAULT 0,
+            threshold REAL NOT NULL DEFAULT 0,
+            last_restock TEXT,
+            expiry_date TEXT,
+            supplier_name TEXT,
+            supplier_contact TEXT,
+            supplier_price REAL NOT NULL DEFAULT 0,
+            unit_price REAL NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0,
+            status TEXT,
+            remarks TEXT
+        );
+        CREATE TABLE IF NOT EXISTS inventory_lots (
+            item_id INTEGER NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+            lot INTEGER NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0,
+            expiry_date TEXT,
+            received TEXT,
+            PRIMARY KEY (item_id, lot)
+        );
+        CREATE INDEX IF NOT EXISTS idx_inventory_lots_expiry ON inventory_lots(expiry_date);
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY,
+            datetime TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            status TEXT
+        );
+        CREATE TABLE IF NOT EXISTS order_lines (
+            order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+            line_no INTEGER NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            name TEXT,
+            price REAL NOT NULL DEFAULT 0,
+            quantity NUMERIC NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (order_id, line_no)
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_datetime ON orders(datetime);
+        CREATE INDEX IF NOT EXISTS idx_order_lines_menu_item ON order_lines(menu_item_id);
+    """
+
+    def __init__(self, path=SQLITE_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _table(self, dataset):
+        return {"menu": ("menu_items", MENU_FIELDS), "inventory": ("inventory", INVENTORY_FIELDS)}[dataset]
+
+    def load(self, dataset, default_data):
+        if dataset == "orders":
+            return self._load_orders() or list(default_data)
+        table, fields = self._table(dataset)
+        rows = self.conn.execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY rowid").fetchall()
+        if not rows:
+            return default_data
+        records = [dict(row) for row in rows]
+        if dataset == "menu":
+            for record in records:
+                record["available"] = bool(record["available"])
+        else:
+            self._attach_lots(records)
+        return records
+
+    def _attach_lots(self, records):
+        lots = {}
+        for row in self.conn.execute(
+            "SELECT item_id, lot, quantity, expiry_date, received FROM inventory_lots ORDER BY item_id, lot"
+        ):
+            lots.setdefault(row["item_id"], []).append({"lot": row["lot"], "quantity": row["quantity"],
+                                                        "expiry_date": row["expiry_date"] or "",
+                                                        "received": row["received"] or ""})
+        # A database from before lot tracking has no lots yet; ensure_lots() fills them in
+        if lots:
+            for record in records:
+                record["lots"] = lots.get(record["id"], [])
+
+    def _load_orders(self):
+        orders = {}
+        for row in self.conn.execute("SELECT id, datetime, total, status FROM orders ORDER BY datetime, id"):
+            orders[row["id"]] = {"id": row["id"], "datetime": row["datetime"], "items": [],
+                                 "total": row["total"], "status": row["status"]}
+        lines = self.conn.execute(
+            "SELECT order_id, menu_item_id, name, price, quantity, total FROM order_lines ORDER BY order_id, line_no"
+        )
+        for row in lines:
+            order = orders.get(row["order_id"])
+            if order is not None:
+                order["items"].append({"id": row["menu_item_id"], "name": row["name"], "price": row["price"],
+                                       "quantity": row["quantity"], "total": row["total"]})
+        return list(orders.values())
+
+    def upsert(self, dataset, record):
+        table, fields = self._table(dataset)
+        values = [record.get(field) for field in fields]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+            values
+        )
+        if dataset == "inventory" and "lots" in record:
+            self.conn.execute("DELETE FROM inventory_lots WHERE item_id = ?", (record.get("id"),))
+            self.conn.executemany(
+                "INSERT INTO inventory_lots (item_id, lot, quantity, expiry_date, received) VALUES (?, ?, ?, ?, ?)",
+                [(record.get("id"), lot["lot"], lot["quantity"], lot["expiry_date"], lot.get("received", ""))
+                 for lot in record["lots"]]
+            )
+
+    def delete(self, dataset, record_id):
+        if dataset == "orders":
+            self.conn.execute("DELETE FROM orders WHERE id = ?", (record_id,))
+            return
+        table, _ = self._table(dataset)
+        self.conn.execute(f"DELETE FROM {table} WHERE id = ?", (record_id,))
+
+    def append_order(self, order):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO orders (id, datetime, total, status) VALUES (?, ?, ?, ?)",
+            (order.get("id"), order.get("datetime", ""), order.get("total", 0), order.get("status", ""))
+        )
+        self.conn.execute("DELETE FROM order_lines WHERE order_id = ?", (order.get("id"),))
+        self.conn.executemany(
+            "INSERT INTO order_lines (order_id, line_no, menu_item_id, name, price, quantity, total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(order.get("id"), line_no, item.get("id"), item.get("name"), item.get("price", 0),
+              item.get("quantity", 0), item.get("total", 0))
+             for line_no, item in enumerate(order.get("items", []))]
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class WriteBehindStore:
+    """Queues writes for a background thread that applies them to `store` in coalesced batches.
+
+    Writes are keyed by (dataset, record id), so repeated edits of the same record
+    inside one window reach the disk once. commit() only wakes the worker; the
+    caller never waits on I/O. Writes made inside `with store.batch():` are queued
+    together, so the worker applies all of them in one store commit or none.
+    A failed batch stays queued and is retried with a doubling delay; the error
+    is kept in `last_error` (None once a write succeeds again) for the UI to
+    report. Call close() on exit to flush whatever is pending.
+    """
+    def __init__(self, store, window=PERSIST_WINDOW):
+        self.store = store
+        self.window = window
+        self.last_error = None
+        self.failures = 0  # consecutive failed batches
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # .batch: writes collected by an open batch() on this thread
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="canteen-persistence", daemon=True)
+        self._thread.start()
+
+    def load(self, dataset, default_data):
+        return self.store.load(dataset, default_data)
+
+    def _queue(self, dataset, record_id, op):
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.append((dataset, record_id, op))
+            return
+        self._queue_all([(dataset, record_id, op)])
+
+    def _queue_all(self, writes):
+        with self._lock:
+            for dataset, record_id, op in writes:
+                self._pending.pop((dataset, record_id), None)
+                self._pending[(dataset, record_id)] = op
+            self._idle.clear()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Collect the writes made in the block and queue them under one lock acquisition.
+
+        The worker swaps its pending writes under the same lock, so it sees the
+        whole batch or none of it. If the block raises, nothing is queued.
+        """
+        if getattr(self._local, "batch", None) is not None:
+            yield self  # nested: part of the enclosing batch
+            return
+        self._local.batch = []
+        try:
+            yield self
+            writes = self._local.batch
+        finally:
+            self._local.batch = None
+        self._queue_all(writes)
+
+    def upsert(self, dataset, record):
+        self._queue(dataset, record.get("id"), ("upsert", dataset, dict(record)))
+
+    def delete(self, dataset, record_id):
+        self._queue(dataset, record_id, ("delete", dataset, record_id))
+
+    def append_order(self, order):
+        self._queue("orders", order.get("id"), ("append", "orders", dict(order)))
+
+    def write_file(self, filename, produce):
+        """Atomically write `produce()` as JSON to `filename` on the worker thread"""
+        self._queue("files", filename, ("file", filename, produce))
+
+    def append_file(self, filename, append):
+        """Call `append()` on the worker thread to write out whatever has accumulated for `filename`"""
+        self._queue("files", filename, ("append_file", filename, append))
+
+    def commit(self):
+        self._wake.set()
+
+    def rollback(self):
+        # Queued writes are applied (and retried) by the worker, and a failed
+        # batch() queues nothing, so there is nothing for the UI thread to undo.
+        pass
+
+    def _run(self):
+        while not self._closing.is_set():
+            self._wake.wait()
+            delay = min(self.window * 2 ** self.failures, PERSIST_RETRY_MAX) if self.failures else self.window
+            self._closing.wait(delay)
+            self._wake.clear()
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._lock:
+            ops, self._pending = self._pending, {}
+        if not ops:
+            self._idle.set()
+            return
+        try:
+            for kind, dataset, payload in ops.values():
+                if kind == "upsert":
+                    self.store.upsert(dataset, payload)
+                elif kind == "delete":
+                    self.store.delete(dataset, payload)
+                elif kind == "file":
+                    atomic_write_json(dataset, payload())
+                elif kind == "append_file":
+                    payload()
+                else:
+                    self.store.append_order(payload)
+            self.store.commit()
+            self.last_error = None
+            self.failures = 0
+        except Exception as e:
+            self.store.rollback()
+            self.last_error = e
+            self.failures += 1
+            with self._lock:
+                # Requeue the failed batch; anything queued meanwhile is newer and wins.
+                ops.update(self._pending)
+                self._pending = ops
+            self._wake.set()
+            return
+        with self._lock:
+            if not self._pending:
+                self._idle.set()
+
+    def flush(self, timeout=None):
+        """Wake the worker and block until everything queued so far is on disk"""
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=10):
+        self.flush(timeout)
+        self._closing.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._write_pending()
+        self.store.close()
+
+
+def migrate_json_to_sqlite(db_path=SQLITE_DB, files=None):
+    """One-shot import of menu.json, inventory.json and orders.json into a SQLite database"""
+    source = JsonStore(files)
+    target = SQLiteStore(db_path)
+    try:
+        for record in source.load("menu", []):
+            target.upsert("menu", record)
+        for record in source.load("inventory", []):
+            target.upsert("inventory", record)
+        for order in source.load("orders", []):
+            target.append_order(order)
+        target.commit()
+    except Exception:
+        target.rollback()
+        raise
+    finally:
+        source.close()
+    return target
+
+
+def open_store(backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        if not os.path.exists(SQLITE_DB):
+            return migrate_json_to_sqlite(SQLITE_DB)
+        return SQLiteStore(SQLITE_DB)
+    return JsonStore()
+
+
+# --- Order archive ---
+# Closed months are sealed into one directory per month holding fixed-width
+# column files, so old history is scanned through memory maps instead of being
+# kept around as nested dicts.
+
+ARCHIVE_DIR = "archive"
+RANGE_PRESETS = {"All time": None, "Today": 0, "Last 7 days": 6, "Last 30 days": 29}  # extra days back
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_epoch(dt_string):
+    """Order datetime string -> integer seconds, treating the wall clock as UTC"""
+    return calendar.timegm(time.strptime(dt_string, DATETIME_FORMAT))
+
+
+def from_epoch(ts):
+    return time.strftime(DATETIME_FORMAT, time.gmtime(ts))
+
+
+def day_start_epoch(day):
+    """"YYYY-MM-DD" -> epoch seconds of that day's midnight"""
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def range_for_preset(name):
+    """(start_day, end_day) for a RANGE_PRESETS entry; (None, None) means all time"""
+    days_back = RANGE_PRESETS[name]
+    if days_back is None:
+        return None, None
+    today = datetime.now().date()
+    return (today - timedelta(days=days_back)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+
+
+class OrderIndex:
+    """Live orders kept sorted by their pre-parsed epoch, for O(log n + k) range queries"""
+    def __init__(self, orders=()):
+        pairs = sorted(((self._epoch(order), order) for order in orders), key=lambda pair: pair[0])
+        self.epochs = [ts for ts, _ in pairs]
+        self.orders = [order for _, order in pairs]
+
+    @staticmethod
+    def _epoch(order):
+        """Epoch of the order's datetime, or 0 when it cannot be parsed"""
+        try:
+            return to_epoch(order.get("datetime", ""))
+        except ValueError:
+            return 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        ts = self._epoch(order)
+        if not self.epochs or ts >= self.epochs[-1]:
+            self.epochs.append(ts)
+            self.orders.append(order)
+        else:
+            position = bisect.bisect_right(self.epochs, ts)
+            self.epochs.insert(position, ts)
+            self.orders.insert(position, order)
+
+    def bounds(self, start=None, end=None):
+        """Slice positions of orders with start <= epoch < end"""
+        lo = 0 if start is None else bisect.bisect_left(self.epochs, start)
+        hi = len(self.epochs) if end is None else bisect.bisect_left(self.epochs, end)
+        return lo, max(lo, hi)
+
+    def between(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return self.orders[lo:hi]
+
+    def latest(self, n):
+        return self.orders[:-n - 1:-1]
+
+
+class OrderArchive:
+    """Month-partitioned, memory-mapped columnar store for sealed order history"""
+    COLUMNS = [
+        ("ts", "q"),          # epoch seconds of the order
+        ("order_id", "q"),
+        ("item_id", "q"),
+        ("quantity", "q"),    # menu items are sold in whole units
+        ("price", "d"),
+        ("name", "i"),        # index into meta["names"]
+        ("status", "i"),      # index into meta["statuses"]
+    ]
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._open = {}
+        self._meta = {}
+        self._lock = threading.Lock()  # guards opening and swapping partitions
+        self._seal_lock = threading.Lock()  # one seal at a time: they share the .tmp / .old paths
+        if os.path.isdir(directory):
+            # Finish or undo a reseal that was interrupted half way
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.endswith(".old"):
+                    if os.path.isdir(path[:-4]):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.replace(path, path[:-4])
+                elif name.endswith(".tmp"):
+                    shutil.rmtree(path, ignore_errors=True)
+            for month in os.listdir(directory):
+                meta_path = os.path.join(directory, month, "meta.json")
+                if os.path.exists(meta_path):
+                    with open(meta_path, "r") as file:
+                        self._meta[month] = json.load(file)
+
+    def months(self):
+        return sorted(self._meta)
+
+    def order_count(self):
+        return sum(meta["orders"] for meta in self._meta.values())
+
+    def max_order_id(self):
+        return max((meta["max_order_id"] for meta in self._meta.values()), default=0)
+
+    def seal(self, month, orders):
+        """Write `orders` (all from `month`) as a partition, merging with an existing one.
+
+        Readers that already hold the old partition's columns keep reading it
+        until they let go; later columns() calls see the new one. Seals from
+        different threads run one after the other, each merging with the last.
+        """
+        with self._seal_lock:
+            self._seal(month, orders)
+
+    def _seal(self, month, orders):
+        rows = []
+        seen = set()
+        if month in self._meta:
+            for row in self.iter_lines([month]):
+                rows.append(row)
+                seen.add(row[1])
+        for order in orders:
+            if order.get("id") in seen:
+                continue
+            ts = to_epoch(order.get("datetime", ""))
+            for item in order.get("items", []):
+                rows.append((ts, order.get("id"), item.get("id"), item.get("quantity", 0),
+                             item.get("price", 0), item.get("name", ""), order.get("status", "")))
+        rows.sort(key=lambda row: (row[0], row[1]))
+        names, statuses = {}, {}
+        columns = {name: array.array(code) for name, code in self.COLUMNS}
+        for ts, order_id, item_id, quantity, price, name, status in rows:
+            columns["ts"].append(ts)
+            columns["order_id"].append(order_id)
+            columns["item_id"].append(item_id)
+            columns["quantity"].append(quantity)
+            columns["price"].append(price)
+            columns["name"].append(names.setdefault(name, len(names)))
+            columns["status"].append(statuses.setdefault(status, len(statuses)))
+        meta = {
+            "rows": len(rows),
+            "orders": len({row[1] for row in rows}),
+            "max_order_id": max((row[1] for row in rows), default=0),
+            "names": list(names),
+            "statuses": list(statuses),
+        }
+        final_dir = os.path.join(self.directory, month)
+        tmp_dir = final_dir + ".tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, _ in self.COLUMNS:
+            with open(os.path.join(tmp_dir, name + ".bin"), "wb") as file:
+                columns[name].tofile(file)
+        atomic_write_json(os.path.join(tmp_dir, "meta.json"), meta)
+        old_dir = final_dir + ".old"
+        with self._lock:
+            if os.path.isdir(final_dir):
+                os.replace(final_dir, old_dir)
+            os.replace(tmp_dir, final_dir)
+            self._open.pop(month, None)  # mapped files stay readable for current holders
+            self._meta[month] = meta
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def columns(self, month):
+        """Memory-mapped column views plus the partition meta for `month`; safe from worker threads"""
+        with self._lock:
+            return self._columns(month)
+
+    def _columns(self, month):
+        if month not in self._open:
+            meta = self._meta[month]
+            maps, views = [], {}
+            for name, code in self.COLUMNS:
+                if meta["rows"] == 0:
+                    views[name] = memoryview(array.array(code))
+                    continue
+                with open(os.path.join(self.directory, month, name + ".bin"), "rb") as file:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(mapped)
+                views[name] = memoryview(mapped).cast(code)
+            self._open[month] = (maps, views, meta)
+        _, views, meta = self._open[month]
+        return views, meta
+
+    def close(self):
+        """Unmap every partition; only call once no reader is left (on exit)"""
+        with self._lock:
+            opened, self._open = self._open, {}
+        for maps, views, _ in opened.values():
+            for view in views.values():
+                view.release()
+            for mapped in maps:
+                mapped.close()
+
+    def iter_lines(self, months=None):
+        """Yield (ts, order_id, item_id, quantity, price, name, status) tuples"""
+        for month in months or self.months():
+            cols, meta = self.columns(month)
+            names, statuses = meta["names"], meta["statuses"]
+            yield from zip(cols["ts"], cols["order_id"], cols["item_id"], cols["quantity"], cols["price"],
+                           (names[code] for code in cols["name"]), (statuses[code] for code in cols["status"]))
+
+    def iter_orders(self, months=None):
+        """Rebuild order dicts (only for callers that really need them, e.g. recent orders)"""
+        order = None
+        for ts, order_id, item_id, quantity, price, name, status in self.iter_lines(months):
+            if order is None or order["id"] != order_id:
+                if order is not None:
+                    yield order
+                order = {"id": order_id, "datetime": from_epoch(ts), "items": [], "total": 0, "status": status}
+            order["items"].append({"id": item_id, "name": name, "price": price,
+                                   "quantity": quantity, "total": quantity * price})
+            order["total"] += quantity * price
+        if order is not None:
+            yield order
+
+    def latest(self, month, count):
+        """The newest `count` orders of `month`, newest first, read backwards from the end of the partition"""
+        cols, meta = self.columns(month)
+        names, statuses = meta["names"], meta["statuses"]
+        orders = []
+        row = meta["rows"] - 1
+        while row >= 0 and len(orders) < count:
+            last, order_id = row, cols["order_id"][row]
+            while row >= 0 and cols["order_id"][row] == order_id:
+                row -= 1
+            items = []
+            for line in range(row + 1, last + 1):
+                quantity, price = cols["quantity"][line], cols["price"][line]
+                items.append({"id": cols["item_id"][line], "name": names[cols["name"][line]], "price": price,
+                              "quantity": quantity, "total": quantity * price})
+            orders.append({"id": order_id, "datetime": from_epoch(cols["ts"][last]), "items": items,
+                           "total": sum(item["total"] for item in items), "status": statuses[cols["status"][last]]})
+        return orders
+
+
+HISTORY_TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
+def parse_history_time(text, end=False):
+    """Filter-bar time -> epoch; a bare date means that day's start (or, with end=True, the next day's)"""
+    text = text.strip()
+    if not text:
+        return None
+    for fmt in HISTORY_TIME_FORMATS:
+        try:
+            ts = calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            continue
+        return ts + 86400 if end and fmt == "%Y-%m-%d" else ts
+    return day_start_epoch(normalize_date(text)) + (86400 if end else 0)
+
+
+class OrderHistoryIndex:
+    """Every order, archived and live, indexed for lookup by id, time range, menu item and total.
+
+    Orders get a position in time order; per-position arrays hold the id,
+    epoch, total and where to find the order's lines. On top of that: a hash
+    from order id to position, a sorted posting list of positions per menu
+    item, and the positions sorted by total. A query starts from whichever
+    index narrows it most and checks the other conditions per candidate.
+    """
+    def __init__(self, archive, live_orders):
+        self.archive = archive
+        self.months = archive.months()
+        self.statuses = []
+        self.ids = array.array("q")
+        self.epochs = array.array("q")
+        self.totals = array.array("d")
+        self.month_of = array.array("h")  # index into self.months, -1 for live orders
+        self.row_of = array.array("q")    # first line in the month partition, or index into self.live
+        self.status_of = array.array("h")
+        self.live = []
+        self.partitions = []  # (columns, meta) per month as indexed; kept even if the month is resealed
+        self.by_id = {}
+        self.by_item = {}  # menu item id -> array of positions, ascending
+        self.stale = False
+        for month_no, month in enumerate(self.months):
+            self._add_month(month_no, month)
+        for order in live_orders:
+            self._append_live(order)
+        if any(a > b for a, b in zip(self.epochs, self.epochs[1:])):
+            self._sort_by_time()
+        self.by_total = array.array("q", sorted(range(len(self.ids)), key=self.totals.__getitem__))
+        self.sorted_totals = array.array("d", (self.totals[p] for p in self.by_total))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _status(self, name):
+        try:
+            return self.statuses.index(name)
+        except ValueError:
+            self.statuses.append(name)
+            return len(self.statuses) - 1
+
+    def _post(self, item_id, position):
+        postings = self.by_item.get(item_id)
+        if postings is None:
+            postings = self.by_item[item_id] = array.array("q")
+        if not postings or postings[-1] != position:
+            postings.append(position)
+
+    def _add_month(self, month_no, month):
+        cols, meta = self.archive.columns(month)
+        self.partitions.append((cols, meta))
+        statuses = [self._status(name) for name in meta["statuses"]]
+        position = len(self.ids) - 1
+        last_id = None
+        for row, (ts, order_id, item_id, quantity, price, status) in enumerate(zip(
+                cols["ts"], cols["order_id"], cols["item_id"], cols["quantity"], cols["price"], cols["status"])):
+            if order_id != last_id:
+                last_id = order_id
+                position += 1
+                self.by_id[order_id] = position
+                self.ids.append(order_id)
+                self.epochs.append(ts)
+                self.totals.append(0.0)
+                self.month_of.append(month_no)
+                self.row_of.append(row)
+                self.status_of.append(statuses[status])
+            self.totals[position] += quantity * price
+            self._post(item_id, position)
+
+    def _append_live(self, order):
+        position = len(self.ids)
+        self.by_id[order["id"]] = position
+        self.ids.append(order["id"])
+        self.epochs.append(OrderIndex._epoch(order))
+        self.totals.append(float(order.get("total", 0)))
+        self.month_of.append(-1)
+        self.row_of.append(len(self.live))
+        self.status_of.append(self._status(order.get("status", "")))
+        self.live.append(order)
+        for item in order.get("items", []):
+            self._post(item["id"], position)
+
+    def _sort_by_time(self):
+        """Only needed when live orders carry times older than the archive"""
+        order = sorted(range(len(self.ids)), key=self.epochs.__getitem__)
+        for name in ("ids", "epochs", "totals", "month_of", "row_of", "status_of"):
+            column = getattr(self, name)
+            setattr(self, name, array.array(column.typecode, (column[p] for p in order)))
+        self.by_id = {order_id: position for position, order_id in enumerate(self.ids)}
+        moved = {old: new for new, old in enumerate(order)}
+        self.by_item = {item_id: array.array("q", sorted(moved[p] for p in postings))
+                        for item_id, postings in self.by_item.items()}
+
+    def add(self, order):
+        """Index a new order; one older than the newest indexed marks the index stale instead"""
+        ts = OrderIndex._epoch(order)
+        if self.epochs and ts < self.epochs[-1]:
+            self.stale = True
+            return
+        self._append_live(order)
+        position = len(self.ids) - 1
+        slot = bisect.bisect_right(self.sorted_totals, self.totals[position])
+        self.sorted_totals.insert(slot, self.totals[position])
+        self.by_total.insert(slot, position)
+
+    def query(self, order_id=None, start=None, end=None, item_id=None, min_total=None, max_total=None):
+        """Positions of matching orders, newest first (a range when only the time bounds are set)"""
+        lo, hi = self._time_bounds(start, end)
+        totals_given = min_total is not None or max_total is not None
+        if order_id is not None:
+            position = self.by_id.get(order_id)
+            candidates = [] if position is None else [position]
+        else:
+            # Start from the narrowest of the time, item and total indexes
+            options = [(hi - lo, "time")]
+            if item_id is not None:
+                postings = self.by_item.get(item_id, ())
+                a, b = bisect.bisect_left(postings, lo), bisect.bisect_left(postings, hi)
+                options.append((b - a, "item"))
+            if totals_given:
+                t_lo, t_hi = self._total_bounds(min_total, max_total)
+                options.append((t_hi - t_lo, "total"))
+            _, driver = min(options)
+            if driver == "time":
+                if item_id is None and not totals_given:
+                    return range(hi - 1, lo - 1, -1)
+                candidates = range(hi - 1, lo - 1, -1)
+            elif driver == "item":
+                candidates = reversed(postings[a:b])
+            else:
+                candidates = sorted((p for p in self.by_total[t_lo:t_hi] if lo <= p < hi), reverse=True)
+        matches = []
+        for p in candidates:
+            if not lo <= p < hi:
+                continue
+            if min_total is not None and self.totals[p] < min_total:
+                continue
+            if max_total is not None and self.totals[p] > max_total:
+                continue
+            if item_id is not None and not self._contains(p, item_id):
+                continue
+            matches.append(p)
+        return matches
+
+    def query_by_total(self, descending=False, **filters):
+        """Positions matching query(**filters), ordered by total straight off the by_total index"""
+        if filters.get("order_id") is not None:
+            return self.query(**filters)  # at most one order
+        lo, hi = self._time_bounds(filters.get("start"), filters.get("end"))
+        t_lo, t_hi = self._total_bounds(filters.get("min_total"), filters.get("max_total"))
+        if filters.get("item_id") is not None:
+            wanted = set(self.query(**filters))
+            matches = [p for p in self.by_total[t_lo:t_hi] if p in wanted]
+        elif lo == 0 and hi == len(self.epochs):
+            matches = self.by_total[t_lo:t_hi].tolist()
+        else:
+            matches = [p for p in self.by_total[t_lo:t_hi] if lo <= p < hi]
+        if descending:
+            matches.reverse()
+        return matches
+
+    def _time_bounds(self, start, end):
+        lo = 0 if start is None else bisect.bisect_left(self.epochs, start)
+        hi = len(self.epochs) if end is None else bisect.bisect_left(self.epochs, end)
+        return lo, max(lo, hi)
+
+    def _total_bounds(self, min_total, max_total):
+        t_lo = 0 if min_total is None else bisect.bisect_left(self.sorted_totals, min_total)
+        t_hi = len(self.sorted_totals) if max_total is None else bisect.bisect_right(self.sorted_totals, max_total)
+        return t_lo, max(t_lo, t_hi)
+
+    def _contains(self, position, item_id):
+        postings = self.by_item.get(item_id, ())
+        i = bisect.bisect_left(postings, position)
+        return i < len(postings) and postings[i] == position
+
+    def order(self, position):
+        """The full order dict at `position`"""
+        month_no = self.month_of[position]
+        if month_no < 0:
+            return self.live[self.row_of[position]]
+        cols, meta = self.partitions[month_no]
+        row, items = self.row_of[position], []
+        while row < meta["rows"] and cols["order_id"][row] == self.ids[position]:
+            quantity, price = cols["quantity"][row], cols["price"][row]
+            items.append({"id": cols["item_id"][row], "name": meta["names"][cols["name"][row]],
+                          "price": price, "quantity": quantity, "total": quantity * price})
+            row += 1
+        return {"id": self.ids[position], "datetime": from_epoch(self.epochs[position]), "items": items,
+                "total": self.totals[position], "status": self.statuses[self.status_of[position]]}
+
+
+# --- Menu ---
+
+QUICK_ENTRY_LIMIT = 8  # matches listed under the order quick-entry bar
+# leading quantity, then "x"/"*" or just a space: "3 veg sand", "2x21", "2 x veg" ("3 xtra" is not a multiplier)
+QUICK_ENTRY_PATTERN = re.compile(r"^\s*(\d+)\s*(?:[xX](?=[\s\d])\s*|\*\s*|\s+)(\S.*)$")
+
+
+class PrefixTrie:
+    """Maps each prefix of the added words to the set of ids added under that word"""
+    def __init__(self):
+        self.root = ({}, set())
+
+    def add(self, word, item_id):
+        children, ids = self.root
+        for char in word:
+            node = children.get(char)
+            if node is None:
+                node = children[char] = ({}, set())
+            children, ids = node
+            ids.add(item_id)
+
+    def discard(self, word, item_id):
+        path = []
+        children, _ = self.root
+        for char in word:
+            node = children.get(char)
+            if node is None:
+                break
+            node[1].discard(item_id)
+            path.append((children, char, node))
+            children = node[0]
+        for parent, char, node in reversed(path):
+            if node[1] or node[0]:
+                break
+            del parent[char]
+
+    def ids(self, prefix):
+        children, ids = self.root
+        for char in prefix:
+            node = children.get(char)
+            if node is None:
+                return set()
+            children, ids = node
+        return ids
+
+
+def parse_quick_entry(text):
+    """Split quick-entry text into (quantity, query): "3 veg sand" -> (3, "veg sand"), "2x21" -> (2, "21")"""
+    match = QUICK_ENTRY_PATTERN.match(text)
+    if match:
+        return int(match.group(1)), match.group(2).strip()
+    return 1, text.strip()
+
+
+class MenuCatalog:
+    """Menu items indexed by id, normalized name and category, plus the available items.
+
+    Iterates in insertion order like the list it replaces, so the stores, the
+    exports and the tree views read it unchanged. Ids handed out by next_id
+    only ever grow, so a deleted item's id is not reused while the app runs.
+    """
+    def __init__(self, items=()):
+        self.by_id = {}        # id -> item
+        self.by_name = {}      # normalized name -> item
+        self.by_category = {}  # category -> {id: item}
+        self.available = {}    # id -> item, for items on sale
+        self.words = PrefixTrie()  # words of item names, for quick entry
+        self.codes = PrefixTrie()  # item ids as typed short codes
+        self.next_id = 1
+        for item in items:
+            self.put(item)
+
+    @staticmethod
+    def normalize(name):
+        return " ".join(str(name).lower().split())
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, item_id):
+        return self.by_id.get(item_id)
+
+    def find(self, name):
+        return self.by_name.get(self.normalize(name))
+
+    def in_category(self, category):
+        return list(self.by_category.get(category, {}).values())
+
+    def categories(self):
+        return sorted(self.by_category)
+
+    def available_items(self):
+        return list(self.available.values())
+
+    def add(self, item):
+        if item["id"] in self.by_id:
+            raise ValueError(f"Menu item id {item['id']} is already in use")
+        self.put(item)
+
+    def put(self, item):
+        """Add `item`, or replace the item with the same id in its current position"""
+        item_id = item["id"]
+        old = self.by_id.get(item_id)
+        if old is not None:
+            self._unindex(old)
+        self.by_id[item_id] = item
+        self.by_name[self.normalize(item.get("name", ""))] = item
+        self.by_category.setdefault(item.get("category", ""), {})[item_id] = item
+        for word in self.normalize(item.get("name", "")).split():
+            self.words.add(word, item_id)
+        self.codes.add(str(item_id), item_id)
+        if item.get("available", False):
+            self.available[item_id] = item
+        else:
+            self.available.pop(item_id, None)
+        self.next_id = max(self.next_id, item_id + 1)
+
+    def replace(self, old_id, item):
+        """Swap in an edited copy of the item stored under `old_id` (its id may change)"""
+        if item["id"] != old_id:
+            self.add(item)
+            self.remove(old_id)
+        else:
+            self.put(item)
+
+    def remove(self, item_id):
+        item = self.by_id.pop(item_id, None)
+        if item is not None:
+            self._unindex(item)
+            self.available.pop(item_id, None)
+        return item
+
+    def _unindex(self, item):
+        name = self.normalize(item.get("name", ""))
+        if self.by_name.get(name) is item:
+            del self.by_name[name]
+        category = self.by_category.get(item.get("category", ""), {})
+        category.pop(item["id"], None)
+        if not category:
+            self.by_category.pop(item.get("category", ""), None)
+        for word in name.split():
+            self.words.discard(word, item["id"])
+        self.codes.discard(str(item["id"]), item["id"])
+
+    def search(self, query, limit=QUICK_ENTRY_LIMIT):
+        """Available items matching a quick-entry query: an id prefix, or a prefix of each name word"""
+        query = self.normalize(query)
+        if not query:
+            return []
+        if query.isdigit():
+            matches = self.codes.ids(query)
+            rank = lambda item: (str(item["id"]) != query, item["id"])
+        else:
+            matches = None
+            for word in sorted(query.split(), key=len, reverse=True):  # longest prefixes narrow fastest
+                ids = self.words.ids(word)
+                matches = set(ids) if matches is None else matches & ids
+                if not matches:
+                    return []
+            rank = lambda item: (not self.normalize(item.get("name", "")).startswith(query), item.get("name", ""))
+        items = [self.available[item_id] for item_id in matches if item_id in self.available]
+        items.sort(key=rank)
+        return items[:limit]
+
+
+# --- Recipes ---
+
+RECIPES_FILE = "recipes.json"
+UNIT_FACTORS = {  # unit name -> (dimension, size in the dimension's base unit)
+    "kg": ("mass", 1.0), "g": ("mass", 0.001), "gm": ("mass", 0.001), "grams": ("mass", 0.001),
+    "l": ("volume", 1.0), "liter": ("volume", 1.0), "liters": ("volume", 1.0),
+    "litre": ("volume", 1.0), "litres": ("volume", 1.0), "ml": ("volume", 0.001),
+    "pcs": ("count", 1.0), "pc": ("count", 1.0), "piece": ("count", 1.0), "pieces": ("count", 1.0),
+}
+
+
+def convert_quantity(quantity, from_unit, to_unit):
+    """Convert between units of the same dimension; unit names are case-insensitive"""
+    source, target = str(from_unit).strip().lower(), str(to_unit).strip().lower()
+    if not source or source == target:
+        return quantity
+    if source not in UNIT_FACTORS or target not in UNIT_FACTORS:
+        raise ValueError(f"unknown unit conversion {from_unit} -> {to_unit}")
+    (source_dim, source_size), (target_dim, target_size) = UNIT_FACTORS[source], UNIT_FACTORS[target]
+    if source_dim != target_dim:
+        raise ValueError(f"cannot convert {from_unit} to {to_unit}")
+    return quantity * source_size / target_size
+
+
+class RecipeBook:
+    """Menu item recipes, persisted to recipes.json and compiled against the inventory.
+
+    A recipe line is {"ingredient", "quantity", "unit"} where the ingredient is
+    an inventory item or a sub-recipe (which makes "yield" of "unit" from its
+    own lines). A line without a unit is in the inventory item's unit. The
+    first run seeds the book from RECIPE_MAP.
+    """
+    def __init__(self, path=RECIPES_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.menu = {}          # menu id -> recipe lines
+        self.sub_recipes = {}   # name -> {"yield", "unit", "lines"}
+        self.problems = []      # lines skipped by the last compile
+        self._compiled = None
+
+    def seed(self, recipes=RECIPE_MAP):
+        self.menu = {menu_id: [{"ingredient": name, "quantity": qty} for name, qty in recipe.items()]
+                     for menu_id, recipe in recipes.items()}
+        self.sub_recipes = {}
+        self.invalidate()
+
+    def load(self):
+        """Read the book from disk; returns False (and seeds it) when there is no usable file"""
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            self.menu = {int(menu_id): lines for menu_id, lines in data.get("menu", {}).items()}
+            self.sub_recipes = data.get("sub_recipes", {})
+        except (OSError, ValueError, AttributeError):
+            self.seed()
+            return False
+        self.invalidate()
+        return True
+
+    def snapshot(self):
+        return copy.deepcopy({"menu": {str(menu_id): lines for menu_id, lines in self.menu.items()},
+                              "sub_recipes": self.sub_recipes})
+
+    def invalidate(self):
+        with self.lock:
+            self._compiled = None
+
+    def compile(self, inventory):
+        """CompiledRecipes for `inventory`, cached until invalidate() (recipe or inventory edits)"""
+        with self.lock:
+            if self._compiled is None:
+                by_name = {}
+                for item in inventory:
+                    by_name.setdefault(item["name"], item)
+                self.problems = []
+                vectors = {}
+                for menu_id, lines in self.menu.items():
+                    vector = vectors[menu_id] = {}
+                    self._expand(f"menu item {menu_id}", lines, 1.0, by_name, vector, ())
+                self._compiled = CompiledRecipes(vectors, inventory)
+            return self._compiled
+
+    def _expand(self, owner, lines, factor, by_name, vector, stack):
+        for line in lines:
+            name = line.get("ingredient", "")
+            quantity = float(line.get("quantity", 0)) * factor
+            unit = line.get("unit", "")
+            try:
+                if name in self.sub_recipes:
+                    if name in stack:
+                        raise ValueError(f"sub-recipe '{name}' includes itself")
+                    sub = self.sub_recipes[name]
+                    batches = convert_quantity(quantity, unit, sub.get("unit", "")) / float(sub.get("yield", 1))
+                    self._expand(owner, sub.get("lines", []), batches, by_name, vector, stack + (name,))
+                elif name in by_name:
+                    item = by_name[name]
+                    amount = convert_quantity(quantity, unit, item.get("unit", ""))
+                    vector[item["id"]] = vector.get(item["id"], 0) + amount
+                else:
+                    raise ValueError(f"unknown ingredient '{name}'")
+            except ValueError as e:
+                self.problems.append(f"{owner}: {e}")
+
+
+class CompiledRecipes:
+    """Flat per-menu-item ingredient vectors, plus the cost and usage tables derived from them"""
+    def __init__(self, vectors, inventory):
+        items = {item["id"]: item for item in inventory}
+        self.vectors = vectors  # menu id -> {inventory id: quantity in that item's unit}
+        self.usage = {          # menu id -> {inventory name: quantity}, for the reports
+            menu_id: {items[inv_id]["name"]: qty for inv_id, qty in vector.items()}
+            for menu_id, vector in vectors.items()
+        }
+        self.unit_costs = {     # menu id -> cost of goods for one unit sold
+            menu_id: sum(qty * float(items[inv_id].get("supplier_price", 0) or 0) for inv_id, qty in vector.items())
+            for menu_id, vector in vectors.items()
+        }
+
+    def cost_of(self, units):
+        """Total cost of `units` (menu id -> quantity sold)"""
+        return sum(quantity * self.unit_costs.get(menu_id, 0) for menu_id, quantity in units.items())
+
+    def consumption(self, order_items):
+        """Inventory id -> quantity used by a list of order lines"""
+        needed = {}
+        for item in order_items:
+            for inv_id, qty in self.vectors.get(item["id"], {}).items():
+                needed[inv_id] = needed.get(inv_id, 0) + qty * item["quantity"]
+        return needed
+
+
+# --- Stock ---
+
+STOCK_LEDGER_FILE = "stock_ledger.jsonl"
+LEDGER_CHECKPOINT_EVERY = 64  # movements per item between running-balance checkpoints
+MOVEMENT_KINDS = ("receipt", "sale", "waste", "adjust")
+
+
+def now_epoch():
+    return to_epoch(datetime.now().strftime(DATETIME_FORMAT))
+
+
+class StockLedger:
+    """Append-only log of stock movements per inventory id, one JSON record per line.
+
+    A movement is {"ts", "item", "kind", "qty", "ref"} where qty is the signed
+    change in the item's own unit. Every `checkpoint_every` movements of an
+    item its running balance and per-kind totals are checkpointed, so a
+    point-in-time query is a bisect plus at most that many movements.
+    New lines are buffered in memory until write_pending() appends them to the
+    file (the app queues that on the write-behind thread).
+    """
+    def __init__(self, path=STOCK_LEDGER_FILE, checkpoint_every=LEDGER_CHECKPOINT_EVERY):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.lock = threading.Lock()
+        self.times = {}        # item id -> movement epochs, ascending
+        self.movements = {}    # item id -> [(kind, qty)], parallel to times
+        self.checkpoints = {}  # item id -> [totals after 0, N, 2N, ... movements]
+        self._file = None
+        self._unwritten = []
+
+    def load(self):
+        """Read the ledger; returns False when there is none yet. A torn last line is cut off."""
+        if not os.path.exists(self.path):
+            return False
+        good_offset = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # partial write from a crash; everything before it is intact
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                self._add(record["item"], record["ts"], record["kind"], record["qty"])
+        if good_offset < os.path.getsize(self.path):
+            # so new movements start on a line of their own
+            with open(self.path, "r+b") as file:
+                file.truncate(good_offset)
+        return True
+
+    def record(self, movements):
+        """Add (item id, kind, signed qty, ref) movements stamped now; their lines wait for write_pending()"""
+        ts = now_epoch()
+        lines = []
+        with self.lock:
+            for item_id, kind, qty, ref in movements:
+                if not qty:
+                    continue
+                self._add(item_id, ts, kind, qty)
+                lines.append(json.dumps({"ts": ts, "item": item_id, "kind": kind, "qty": qty, "ref": ref}))
+        self._write(lines)
+
+    def backfill(self, records):
+        """Write historical {"ts", "item", "kind", "qty", "ref"} records (used once, on first start)"""
+        records = sorted(records, key=lambda record: record["ts"])
+        with self.lock:
+            for record in records:
+                self._add(record["item"], record["ts"], record["kind"], record["qty"])
+        self._write([json.dumps(record) for record in records])
+
+    def _write(self, lines):
+        with self.lock:
+            self._unwritten.extend(lines)
+
+    def write_pending(self):
+        """Append the buffered lines to the ledger file in one write"""
+        with self.lock:
+            lines, self._unwritten = self._unwritten, []
+        if not lines:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        except Exception:
+            with self.lock:
+                self._unwritten[:0] = lines  # retried with the next batch
+            raise
+
+    def close(self):
+        self.write_pending()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _add(self, item_id, ts, kind, qty):
+        times = self.times.setdefault(item_id, [])
+        moves = self.movements.setdefault(item_id, [])
+        checkpoints = self.checkpoints.setdefault(item_id, [self._zero()])
+        position = bisect.bisect_right(times, ts)
+        times.insert(position, ts)
+        moves.insert(position, (kind, qty))
+        if position < len(times) - 1:
+            del checkpoints[position // self.checkpoint_every + 1:]  # back-dated: redo later checkpoints
+        while len(checkpoints) * self.checkpoint_every <= len(times):
+            start = (len(checkpoints) - 1) * self.checkpoint_every
+            checkpoints.append(self._advance(checkpoints[-1], moves[start:start + self.checkpoint_every]))
+
+    @staticmethod
+    def _zero():
+        return dict.fromkeys(("balance",) + MOVEMENT_KINDS, 0.0)
+
+    @staticmethod
+    def _advance(totals, moves):
+        totals = dict(totals)
+        for kind, qty in moves:
+            totals["balance"] += qty
+            totals[kind] = totals.get(kind, 0.0) + qty
+        return totals
+
+    def totals_at(self, item_id, ts=None):
+        """Balance and signed per-kind totals of movements before `ts` (None: all of them)"""
+        with self.lock:
+            times = self.times.get(item_id)
+            if not times:
+                return self._zero()
+            position = len(times) if ts is None else bisect.bisect_left(times, ts)
+            index = position // self.checkpoint_every
+            start = index * self.checkpoint_every
+            return self._advance(self.checkpoints[item_id][index], self.movements[item_id][start:position])
+
+    def balance_at(self, item_id, ts=None):
+        return self.totals_at(item_id, ts)["balance"]
+
+    def usage_between(self, item_id, start=None, end=None, kind="sale"):
+        """Quantity taken out by `kind` movements with start <= ts < end"""
+        used = -self.totals_at(item_id, end)[kind]
+        if start is not None:
+            used += self.totals_at(item_id, start)[kind]
+        return used
+
+
+EXPIRY_WARNING_DAYS = 7
+DATE_INPUT_FORMATS = ["%Y-%m-%d", "%d/%m/%y", "%d/%m/%Y", "%d-%m-%Y", "%d-%m-%y", "%Y/%m/%d"]
+
+
+def normalize_date(value):
+    """Date typed in any of DATE_INPUT_FORMATS (e.g. "23/11/25") -> "YYYY-MM-DD"; "" stays ""."""
+    value = str(value or "").strip()
+    if not value:
+        return ""
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date '{value}'")
+
+
+def sync_lots(item):
+    """Derive the item's quantity and (earliest) expiry_date from its lots"""
+    lots = item["lots"]
+    item["quantity"] = round(sum(lot["quantity"] for lot in lots), 6)
+    item["expiry_date"] = min((lot["expiry_date"] for lot in lots if lot["expiry_date"]), default="")
+    item["total_value"] = item["quantity"] * float(item.get("unit_price", 0) or 0)
+
+
+def ensure_lots(item):
+    """Give a record from before lot tracking a single lot holding its whole quantity"""
+    if "lots" not in item:
+        try:
+            expiry = normalize_date(item.get("expiry_date", ""))
+        except ValueError:
+            expiry = ""
+        quantity = float(item.get("quantity", 0) or 0)
+        item["lots"] = [{"lot": 1, "quantity": quantity, "expiry_date": expiry,
+                         "received": item.get("last_restock", "")}] if quantity else []
+    sync_lots(item)
+
+
+def add_lot(item, quantity, expiry_date, received=None):
+    """Return a copy of item["lots"] with a new lot appended"""
+    number = max((lot["lot"] for lot in item["lots"]), default=0) + 1
+    return item["lots"] + [{"lot": number, "quantity": float(quantity), "expiry_date": normalize_date(expiry_date),
+                            "received": received or datetime.now().strftime("%Y-%m-%d")}]
+
+
+def consume_fefo(lots, quantity):
+    """Take `quantity` first-expired-first-out; returns (remaining lots, shortfall)"""
+    remaining = []
+    # lots without an expiry date go last
+    for lot in sorted(lots, key=lambda lot: (not lot["expiry_date"], lot["expiry_date"], lot["lot"])):
+        taken = min(lot["quantity"], quantity)
+        quantity -= taken
+        if lot["quantity"] - taken > 1e-9:
+            remaining.append(dict(lot, quantity=round(lot["quantity"] - taken, 6)))
+    remaining.sort(key=lambda lot: lot["lot"])
+    return remaining, max(quantity, 0.0)
+
+
+class ExpiryIndex:
+    """Inventory lots sorted by expiry date, for O(log n + k) expired / expiring-soon queries"""
+    def __init__(self, inventory=()):
+        self.lock = threading.Lock()
+        self.keys = []     # (expiry "YYYY-MM-DD", item id, lot number), ascending
+        self.lots = {}     # (item id, lot number) -> (item name, lot)
+        self.by_item = {}  # item id -> its keys
+        for item in inventory:
+            self.update(item)
+
+    def update(self, item):
+        """Re-index one item's lots (call after any change to them)"""
+        with self.lock:
+            self._drop(item["id"])
+            keys = []
+            for lot in item.get("lots", []):
+                if lot["expiry_date"] and lot["quantity"] > 0:
+                    key = (lot["expiry_date"], item["id"], lot["lot"])
+                    bisect.insort(self.keys, key)
+                    self.lots[key[1:]] = (item["name"], lot)
+                    keys.append(key)
+            self.by_item[item["id"]] = keys
+
+    def remove(self, item_id):
+        with self.lock:
+            self._drop(item_id)
+
+    def _drop(self, item_id):
+        for key in self.by_item.pop(item_id, []):
+            position = bisect.bisect_left(self.keys, key)
+            del self.keys[position]
+            del self.lots[key[1:]]
+
+    def _rows(self, keys):
+        return [{"id": item_id, "name": self.lots[(item_id, number)][0], "lot": number, "expiry_date": expiry,
+                 "quantity": self.lots[(item_id, number)][1]["quantity"]} for expiry, item_id, number in keys]
+
+    def expired(self, today=None):
+        """Lots whose expiry date is before `today`, earliest first"""
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        with self.lock:
+            return self._rows(self.keys[:bisect.bisect_left(self.keys, (today,))])
+
+    def count_expired(self, today=None):
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        with self.lock:
+            return bisect.bisect_left(self.keys, (today,))
+
+    def _window(self, days, today):
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        last = (datetime.strptime(today, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+        return bisect.bisect_left(self.keys, (today,)), bisect.bisect_right(self.keys, (last, float("inf")))
+
+    def count_expiring_within(self, days, today=None):
+        with self.lock:
+            lo, hi = self._window(days, today)
+            return hi - lo
+
+    def items_expiring_within(self, days, today=None):
+        """Ids of items with a lot expiring from `today` up to `days` days after it (expired lots excluded)"""
+        with self.lock:
+            lo, hi = self._window(days, today)
+            return {item_id for _, item_id, _ in self.keys[lo:hi]}
+
+
+# --- Reporting ---
+
+class SalesRollups:
+    """Per-day sales buckets maintained at checkout and persisted to rollups.json.
+
+    Each bucket holds revenue, order count, orders per hour, units per menu id and
+    per item name and ingredient consumption, so reports only have to add up
+    buckets instead of rescanning every order. Cost is derived from the units at
+    current prices, the same way a full rescan does it.
+    """
+    def __init__(self, path=ROLLUPS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.days = {}
+        self.sorted_days = []
+        self.order_count = 0
+        self.last_order_id = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            self.days = data["days"]
+            self.sorted_days = sorted(self.days)
+            self.order_count = data["order_count"]
+            self.last_order_id = data["last_order_id"]
+        except Exception:
+            self.reset()
+            return False
+        return True
+
+    def matches(self, order_count, last_order_id):
+        """Cheap consistency check against the order history (e.g. after a crash)"""
+        return self.order_count == order_count and self.last_order_id == last_order_id
+
+    def apply_order(self, order, recipes):
+        """Fold one order into its day bucket, costed with `recipes` (CompiledRecipes)"""
+        dt = order.get("datetime", "")
+        with self.lock:
+            bucket = self.days.get(dt[:10])
+            if bucket is None:
+                bucket = self.days[dt[:10]] = {"revenue": 0, "orders": 0,
+                                               "hours": {}, "items": {}, "names": {}, "usage": {}}
+                bisect.insort(self.sorted_days, dt[:10])
+            bucket["revenue"] += order.get("total", 0)
+            bucket["orders"] += 1
+            hour = dt[11:13]
+            if hour.isdigit():
+                bucket["hours"][hour] = bucket["hours"].get(hour, 0) + 1
+            for item in order.get("items", []):
+                key = str(item["id"])
+                bucket["items"][key] = bucket["items"].get(key, 0) + item["quantity"]
+                bucket["names"][item["name"]] = bucket["names"].get(item["name"], 0) + item["quantity"]
+                for inv_name, qty_per in recipes.usage.get(item["id"], {}).items():
+                    bucket["usage"][inv_name] = bucket["usage"].get(inv_name, 0) + qty_per * item["quantity"]
+            self.order_count += 1
+            self.last_order_id = max(self.last_order_id, order.get("id", 0))
+
+    def rebuild(self, orders, archive, recipes):
+        with self.lock:
+            self.reset()
+        for order in archive.iter_orders():
+            self.apply_order(order, recipes)
+        for order in orders:
+            self.apply_order(order, recipes)
+
+    def days_between(self, start_day=None, end_day=None):
+        """Day keys with start_day <= day <= end_day ("YYYY-MM-DD", either bound optional)"""
+        lo = 0 if start_day is None else bisect.bisect_left(self.sorted_days, start_day)
+        hi = len(self.sorted_days) if end_day is None else bisect.bisect_right(self.sorted_days, end_day)
+        return self.sorted_days[lo:hi]
+
+    def snapshot(self):
+        with self.lock:
+            return copy.deepcopy({"days": self.days, "order_count": self.order_count,
+                                  "last_order_id": self.last_order_id})
+
+
+class ReportAggregates:
+    """Every aggregate shown by the report tabs and the PDF export, built in one scan.
+
+    Archived partitions are read column-wise and live orders are walked once;
+    ingredient usage and cost are then derived from per-item unit totals instead
+    of being recomputed for every order line.
+    """
+    def __init__(self):
+        self.sales_by_day = {}
+        self.item_sales = {}      # name -> quantity sold
+        self.item_units = {}      # menu id -> quantity sold
+        self.hour_counts = {}     # "HH" -> number of orders
+        self.total_revenue = 0
+        self.used = {}            # inventory name -> quantity consumed
+        self.stock = {}           # inventory name -> quantity on hand (at the end of the range)
+        self.total_cost = 0
+        self.low_stock = []
+        self.expired_items = []
+        self.expiry_trend = {}    # "YYYY-MM" -> expired lots
+
+    @property
+    def net_profit(self):
+        return self.total_revenue - self.total_cost
+
+    @classmethod
+    def from_rollups(cls, rollups, inventory, recipes, start_day=None, end_day=None):
+        """Add up the day buckets in range; costs O(days x items), independent of the order count"""
+        data = cls()
+        with rollups.lock:
+            for day in rollups.days_between(start_day, end_day):
+                bucket = rollups.days[day]
+                data.sales_by_day[day] = bucket["revenue"]
+                data.total_revenue += bucket["revenue"]
+                for hour, count in bucket["hours"].items():
+                    data.hour_counts[hour] = data.hour_counts.get(hour, 0) + count
+                for item_id, quantity in bucket["items"].items():
+                    data.item_units[int(item_id)] = data.item_units.get(int(item_id), 0) + quantity
+                for name, quantity in bucket["names"].items():
+                    data.item_sales[name] = data.item_sales.get(name, 0) + quantity
+        data.finish(inventory, recipes)
+        return data
+
+    @classmethod
+    def compute(cls, orders, archive, inventory, recipes, epochs=None):
+        """Full rescan of the order history, vectorized with NumPy when it is installed"""
+        if np is not None:
+            return OrderLineColumns(orders, archive, epochs).aggregates(inventory, recipes)
+        return cls.scan(orders, archive, inventory, recipes)
+
+    @classmethod
+    def scan(cls, orders, archive, inventory, recipes):
+        data = cls()
+        for month in archive.months():
+            data.add_partition(*archive.columns(month))
+        for order in orders:
+            data.add_order(order)
+        data.finish(inventory, recipes)
+        return data
+
+    def differences(self, other):
+        """Names of the order-derived aggregates that disagree with `other`"""
+        def same(a, b):
+            if isinstance(a, dict):
+                return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+            return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+        fields = ["sales_by_day", "item_sales", "item_units", "hour_counts", "total_revenue", "used", "total_cost"]
+        return [field for field in fields if not same(getattr(self, field), getattr(other, field))]
+
+    def add_partition(self, cols, meta):
+        by_day, by_hour, by_code = {}, {}, {}
+        item_units = self.item_units
+        last_order = None
+        for ts, order_id, item_id, quantity, price, code in zip(
+                cols["ts"], cols["order_id"], cols["item_id"], cols["quantity"], cols["price"], cols["name"]):
+            day = ts // 86400
+            by_day[day] = by_day.get(day, 0) + quantity * price
+            by_code[code] = by_code.get(code, 0) + quantity
+            item_units[item_id] = item_units.get(item_id, 0) + quantity
+            if order_id != last_order:
+                hour = (ts // 3600) % 24
+                by_hour[hour] = by_hour.get(hour, 0) + 1
+                last_order = order_id
+        for day, total in by_day.items():
+            key = time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+            self.sales_by_day[key] = self.sales_by_day.get(key, 0) + total
+            self.total_revenue += total
+        for code, quantity in by_code.items():
+            name = meta["names"][code]
+            self.item_sales[name] = self.item_sales.get(name, 0) + quantity
+        for hour, count in by_hour.items():
+            key = f"{hour:02d}"
+            self.hour_counts[key] = self.hour_counts.get(key, 0) + count
+
+    def add_order(self, order):
+        dt = order.get("datetime", "")
+        total = order.get("total", 0)
+        self.sales_by_day[dt[:10]] = self.sales_by_day.get(dt[:10], 0) + total
+        self.total_revenue += total
+        hour = dt[11:13]
+        if hour.isdigit():
+            self.hour_counts[hour] = self.hour_counts.get(hour, 0) + 1
+        for item in order.get("items", []):
+            self.item_sales[item["name"]] = self.item_sales.get(item["name"], 0) + item["quantity"]
+            self.item_units[item["id"]] = self.item_units.get(item["id"], 0) + item["quantity"]
+
+    def finish(self, inventory, recipes):
+        for item_id, quantity in self.item_units.items():
+            for inv_name, qty_per in recipes.usage.get(item_id, {}).items():
+                self.used[inv_name] = self.used.get(inv_name, 0) + qty_per * quantity
+        self.total_cost = recipes.cost_of(self.item_units)
+        for item in inventory:
+            self.stock[item["name"]] = item["quantity"]
+            if float(item.get("quantity", 0)) < float(item.get("threshold", 0)):
+                self.low_stock.append(item)
+
+    def add_expired(self, lots):
+        """Expired lots (ExpiryIndex rows) for the wastage report, with a per-month count"""
+        self.expired_items = lots
+        for lot in lots:
+            key = lot["expiry_date"][:7]
+            self.expiry_trend[key] = self.expiry_trend.get(key, 0) + 1
+
+
+class OrderLineColumns:
+    """Order lines flattened into NumPy columns for vectorized report aggregation.
+
+    Archived partitions are wrapped without copying (np.frombuffer over the
+    memory maps); live orders are appended as one extra chunk, using their
+    pre-parsed `epochs` when given. Orders whose datetime cannot be parsed are
+    left out.
+    """
+    def __init__(self, orders, archive, epochs=None):
+        self.names = {}
+        chunks = {"ts": [], "order_id": [], "item_id": [], "quantity": [], "total": [], "name": []}
+        for month in archive.months():
+            cols, meta = archive.columns(month)
+            if meta["rows"] == 0:
+                continue
+            remap = np.array([self.names.setdefault(name, len(self.names)) for name in meta["names"]], dtype=np.int64)
+            quantity = np.frombuffer(cols["quantity"], dtype=np.int64)
+            chunks["ts"].append(np.frombuffer(cols["ts"], dtype=np.int64))
+            chunks["order_id"].append(np.frombuffer(cols["order_id"], dtype=np.int64))
+            chunks["item_id"].append(np.frombuffer(cols["item_id"], dtype=np.int64))
+            chunks["quantity"].append(quantity)
+            chunks["total"].append(quantity * np.frombuffer(cols["price"], dtype=np.float64))
+            chunks["name"].append(remap[np.frombuffer(cols["name"], dtype=np.intc)])
+        live = {key: [] for key in chunks}
+        for position, order in enumerate(orders):
+            if epochs is not None:
+                ts = epochs[position]
+                if ts == 0:
+                    continue  # OrderIndex's epoch for a datetime it could not parse
+            else:
+                try:
+                    ts = to_epoch(order.get("datetime", ""))
+                except ValueError:
+                    continue
+            for item in order.get("items", []):
+                live["ts"].append(ts)
+                live["order_id"].append(order.get("id", 0))
+                live["item_id"].append(item["id"])
+                live["quantity"].append(item["quantity"])
+                live["total"].append(item["quantity"] * item["price"])
+                live["name"].append(self.names.setdefault(item["name"], len(self.names)))
+        for key, values in live.items():
+            chunks[key].append(np.array(values, dtype=np.float64 if key == "total" else np.int64))
+        self.ts, self.order_id, self.item_id, self.quantity, self.total, self.name = (
+            np.concatenate(chunks[key]) for key in ("ts", "order_id", "item_id", "quantity", "total", "name"))
+        self.day = self.ts // 86400
+        self.hour = (self.ts // 3600) % 24
+
+    def aggregates(self, inventory, recipes):
+        data = ReportAggregates()
+        if len(self.ts):
+            days, day_index = np.unique(self.day, return_inverse=True)
+            for day, total in zip(days.tolist(), np.bincount(day_index, weights=self.total).tolist()):
+                data.sales_by_day[time.strftime("%Y-%m-%d", time.gmtime(day * 86400))] = total
+            data.total_revenue = float(self.total.sum())
+            item_ids, item_index = np.unique(self.item_id, return_inverse=True)
+            units = np.zeros(len(item_ids), dtype=np.int64)
+            np.add.at(units, item_index, self.quantity)
+            data.item_units = dict(zip(item_ids.tolist(), units.tolist()))
+            by_name = np.zeros(len(self.names), dtype=np.int64)
+            np.add.at(by_name, self.name, self.quantity)
+            data.item_sales = {name: quantity for name, quantity in zip(self.names, by_name.tolist()) if quantity}
+            _, first_rows = np.unique(self.order_id, return_index=True)
+            per_hour = np.bincount(self.hour[first_rows], minlength=24)
+            data.hour_counts = {f"{hour:02d}": int(count) for hour, count in enumerate(per_hour) if count}
+        data.finish(inventory, recipes)
+        return data
+
+
+# --- Report charts ---
+
+FIGURE_POOL_MAX_PIXELS = 4_000_000  # rendered pixels across all report charts (~16 MB of RGBA)
+ZOOM_LIMITS = (0.5, 3.0)
+SALES_CHART_MAX_BARS = 60  # longer sales histories are grouped into weeks, months, then years
+BAR_TICK_LABELS = 12       # bar charts label at most this many categories on the x axis
+
+
+def week_start(day):
+    """Monday of the week containing a YYYY-MM-DD day"""
+    date = datetime.strptime(day, "%Y-%m-%d")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+def sales_series(sales_by_day):
+    """(period, labels, values) for the sales chart, with at most SALES_CHART_MAX_BARS bars where possible"""
+    days = sorted(sales_by_day)
+    if len(days) <= SALES_CHART_MAX_BARS:
+        return "Daily", days, [sales_by_day[d] for d in days]
+    periods = (
+        ("Weekly", week_start),
+        ("Monthly", lambda d: d[:7]),
+        ("Yearly", lambda d: d[:4]),
+    )
+    for period, bucket in periods:
+        totals = {}
+        for day in days:
+            key = bucket(day)
+            totals[key] = totals.get(key, 0) + sales_by_day[day]
+        if len(totals) <= SALES_CHART_MAX_BARS:
+            break
+    labels = sorted(totals)
+    return period, labels, [totals[label] for label in labels]
+
+
+class ReportChart:
+    """One long-lived Figure + Tk canvas; refreshes update its artists in place.
+
+    The Figure is created directly (not through pyplot), so nothing is left
+    behind in pyplot's global figure registry when a chart goes away. Without
+    a Tk master the chart draws off-screen on an Agg canvas (PDF export).
+    """
+    PIE_START_ANGLE = 140
+
+    def __init__(self, key, master, figsize, title, xlabel="", ylabel="", on_release=None):
+        self.key = key
+        self.base_size = figsize
+        self.zoom = 1.0
+        self.title, self.xlabel, self.ylabel = title, xlabel, ylabel
+        self.on_release = on_release
+        self.figure = Figure(figsize=figsize)
+        self.ax = self.figure.add_subplot()
+        if master is None:
+            self.canvas = FigureCanvasAgg(self.figure)
+        else:
+            self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+            self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.kind = None
+        self.labels = None
+        self.artists = []
+        self.texts = []
+
+    def pixels(self):
+        width, height = self.figure.get_size_inches()
+        return width * height * self.figure.dpi ** 2
+
+    def set_zoom(self, zoom):
+        self.zoom = min(max(zoom, ZOOM_LIMITS[0]), ZOOM_LIMITS[1])
+        self.figure.set_size_inches(self.base_size[0] * self.zoom, self.base_size[1] * self.zoom)
+        self.canvas.draw_idle()
+
+    def _start(self, kind, labels):
+        self.ax.clear()
+        self.ax.set_title(self.title)
+        if self.xlabel:
+            self.ax.set_xlabel(self.xlabel)
+        if self.ylabel:
+            self.ax.set_ylabel(self.ylabel)
+        self.kind, self.labels = kind, labels
+        self.artists, self.texts = [], []
+
+    def _rescale(self):
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def _draw(self):
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def bar(self, labels, values, color=None):
+        labels = list(labels)
+        if self.kind == "bar" and self.labels == labels:
+            for patch, value in zip(self.artists, values):
+                patch.set_height(value)
+            self._rescale()
+        else:
+            self._start("bar", labels)
+            self.artists = list(self.ax.bar(labels, values, color=color))
+            if len(labels) > BAR_TICK_LABELS:
+                step = -(-len(labels) // BAR_TICK_LABELS)
+                ticks = range(0, len(labels), step)
+                self.ax.set_xticks(ticks)
+                self.ax.set_xticklabels([labels[i] for i in ticks], rotation=45, ha="right")
+        self._draw()
+
+    def lines(self, labels, series):
+        """`series` is a list of (values, plot kwargs), one line each"""
+        labels = list(labels)
+        if self.kind == "line" and self.labels == labels and len(self.artists) == len(series):
+            for line, (values, _) in zip(self.artists, series):
+                line.set_ydata(values)
+            self._rescale()
+        else:
+            self._start("line", labels)
+            self.artists = [self.ax.plot(labels, values, **style)[0] for values, style in series]
+            if any(style.get("label") for _, style in series):
+                self.ax.legend()
+        self._draw()
+
+    def pie(self, labels, values):
+        labels = list(labels)
+        total = float(sum(values))
+        if self.kind == "pie" and self.labels == labels and self.artists and total > 0:
+            theta = self.PIE_START_ANGLE
+            for wedge, (label_text, pct_text), value in zip(self.artists, self.texts, values):
+                span = 360.0 * value / total
+                wedge.set_theta1(theta)
+                wedge.set_theta2(theta + span)
+                middle = math.radians(theta + span / 2)
+                label_text.set_position((1.1 * math.cos(middle), 1.1 * math.sin(middle)))
+                label_text.set_horizontalalignment("left" if math.cos(middle) >= 0 else "right")
+                pct_text.set_position((0.6 * math.cos(middle), 0.6 * math.sin(middle)))
+                pct_text.set_text(f"{100 * value / total:.1f}%")
+                theta += span
+        else:
+            self._start("pie", labels)
+            if total > 0:
+                wedges, label_texts, pct_texts = self.ax.pie(values, labels=labels, autopct='%1.1f%%',
+                                                             startangle=self.PIE_START_ANGLE)
+                self.artists = list(wedges)
+                self.texts = list(zip(label_texts, pct_texts))
+        self._draw()
+
+    def release(self):
+        self.canvas.get_tk_widget().destroy()
+        self.figure.clear()
+        if self.on_release is not None:
+            self.on_release()
+
+
+class FigurePool:
+    """LRU set of report charts kept under a total rendered-pixel budget.
+
+    Zooming grows a chart's pixel buffer; when the pool goes over budget the
+    least recently used charts (never the one being touched) are released and
+    rebuilt the next time their tab is shown.
+    """
+    def __init__(self, max_pixels=FIGURE_POOL_MAX_PIXELS):
+        self.max_pixels = max_pixels
+        self.charts = OrderedDict()
+
+    def chart(self, key, master, figsize, title, xlabel="", ylabel="", on_release=None):
+        old = self.charts.pop(key, None)
+        if old is not None:
+            old.on_release = None
+            old.release()
+        chart = self.charts[key] = ReportChart(key, master, figsize, title, xlabel, ylabel, on_release)
+        self._trim(key)
+        return chart
+
+    def touch(self, key):
+        if key in self.charts:
+            self.charts.move_to_end(key)
+
+    def zoom(self, chart, factor):
+        chart.set_zoom(chart.zoom * factor)
+        while chart.pixels() > self.max_pixels and chart.zoom > ZOOM_LIMITS[0]:
+            chart.set_zoom(chart.zoom / 1.2)
+        self.touch(chart.key)
+        self._trim(chart.key)
+
+    def _trim(self, keep):
+        total = sum(chart.pixels() for chart in self.charts.values())
+        for key in list(self.charts):
+            if total <= self.max_pixels:
+                break
+            if key == keep:
+                continue
+            chart = self.charts.pop(key)
+            total -= chart.pixels()
+            chart.release()
+
+
+# --- Report export ---
+# The PDF export runs in worker processes: each chart is rendered to PNG in
+# parallel, then one process lays out the document. Everything handed to them
+# (report aggregates, inventory snapshot, chart specs) is plain picklable data.
+
+EXPORT_PROCESSES = max(1, min(4, (os.cpu_count() or 2) - 1))
+EXPORT_CHART_DPI = 150
+EXPORT_TABLE_BATCH = 40  # table rows per LongTable chunk, about one A4 page
+
+
+def report_chart_specs(data, inventory):
+    """(section, figsize, title, xlabel, ylabel, method, args, kwargs) for the charts shown on the report tabs"""
+    period, periods, sales = sales_series(data.sales_by_day)
+    top_names = list(data.item_sales)
+    available = data.stock
+    inv_names = list(available)
+    months = sorted(data.expiry_trend)
+    hours = sorted(data.hour_counts)
+    return [
+        ("sales", (5, 2.5), f"{period} Sales", "Date", "Revenue (₹)", "bar",
+         (periods, sales), {"color": "#4caf50"}),
+        ("top_selling", (4, 2.5), "Top-Selling Items", "", "", "pie",
+         (top_names, [data.item_sales[n] for n in top_names]), {}),
+        ("usage", (5, 2.5), "Inventory Usage", "Item", "Quantity", "lines",
+         (inv_names, [([available[n] for n in inv_names], {"label": "Available", "marker": "o"}),
+                      ([data.used.get(n, 0) for n in inv_names], {"label": "Used", "marker": "o"})]), {}),
+        ("expiry", (4, 2.5), "Wastage Trend (Expired Items)", "Month", "Count", "lines",
+         (months, [([data.expiry_trend[m] for m in months], {"marker": "o", "color": "red"})]), {}),
+        ("profit", (4, 2.5), "Profit/Loss", "", "Amount (₹)", "bar",
+         (["Revenue", "Cost", "Profit"], [data.total_revenue, data.total_cost, data.net_profit]),
+         {"color": ["#4caf50", "#f44336", "#2196f3"]}),
+        ("peak_hour", (5, 2.5), "Peak Hours (Orders per Hour)", "Hour", "Orders", "lines",
+         (hours, [([data.hour_counts[h] for h in hours], {"marker": "o", "color": "#ff9800"})]), {}),
+    ]
+
+
+def render_chart_png(figsize, title, xlabel, ylabel, method, args, kwargs):
+    """Draw one report chart off-screen and return it as PNG bytes"""
+    chart = ReportChart(None, None, figsize, title, xlabel, ylabel)
+    getattr(chart, method)(*args, **kwargs)
+    buffer = io.BytesIO()
+    chart.figure.savefig(buffer, format="png", dpi=EXPORT_CHART_DPI)
+    return buffer.getvalue()
+
+
+class FlowableStream(list):
+    """List of flowables that is refilled from a generator as reportlab consumes it.
+
+    SimpleDocTemplate.build() wants a list, but only ever looks at the first
+    few entries; keeping just a small window materialized means table rows are
+    turned into flowables one page-sized chunk at a time.
+    """
+    def __init__(self, source, window=4):
+        super().__init__()
+        self.source = iter(source)
+        self.window = window
+
+    def __len__(self):
+        while list.__len__(self) < self.window:
+            try:
+                self.append(next(self.source))
+            except StopIteration:
+                break
+        return list.__len__(self)
+
+
+def table_chunks(header, rows, batch=EXPORT_TABLE_BATCH):
+    """LongTables of at most `batch` rows from a row iterable, each repeating the header"""
+    chunk = [header]
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) > batch:
+            yield LongTable(chunk, repeatRows=1, hAlign='LEFT')
+            chunk = [header]
+    if len(chunk) > 1:
+        yield LongTable(chunk, repeatRows=1, hAlign='LEFT')
+
+
+def report_flowables(data, inventory, charts):
+    """Yield the report PDF flowables section by section; table rows are generated lazily"""
+    styles = getSampleStyleSheet()
+
+    def chart(section):
+        if section in charts:
+            png, (width, height) = charts[section]
+            yield Image(io.BytesIO(png), width=width * inch, height=height * inch)
+            yield Spacer(1, 12)
+
+    # --- Sales Report ---
+    yield Paragraph("Sales Report", styles['Heading2'])
+    yield from chart("sales")
+    sales_by_day = data.sales_by_day
+    days = sorted(sales_by_day.keys())
+    yield from table_chunks(["Date", "Sales (₹)"], ([d, f"{sales_by_day[d]:.2f}"] for d in days))
+    yield Spacer(1, 12)
+    yield Paragraph(f"Total Sales: ₹{sum(sales_by_day.values()):.2f}", styles['Normal'])
+    yield PageBreak()
+
+    # --- Top-Selling Items ---
+    yield Paragraph("Top-Selling Items", styles['Heading2'])
+    yield from chart("top_selling")
+    yield from table_chunks(["Item", "Quantity Sold"], ([name, qty] for name, qty in data.item_sales.items()))
+    yield PageBreak()
+
+    # --- Inventory Usage ---
+    yield Paragraph("Inventory Usage Report", styles['Heading2'])
+    yield from chart("usage")
+    used = data.used
+    available = data.stock
+    yield from table_chunks(["Item", "Available", "Used"],
+                            ([name, available[name], used.get(name, 0)] for name in available))
+    yield PageBreak()
+
+    # --- Low Stock Report ---
+    yield Paragraph("Low Stock Report", styles['Heading2'])
+    yield from table_chunks(["ID", "Name", "Category", "Quantity", "Threshold"], ([
+        item.get("id", ""), item.get("name", ""), item.get("category", ""),
+        item.get("quantity", ""), item.get("threshold", "")
+    ] for item in data.low_stock))
+    yield PageBreak()
+
+    # --- Wastage & Expiry Report ---
+    yield Paragraph("Wastage & Expiry Report", styles['Heading2'])
+    yield from chart("expiry")
+    yield from table_chunks(["ID", "Name", "Lot", "Quantity", "Expiry Date"], (
+        [lot["id"], lot["name"], lot["lot"], f"{lot['quantity']:g}", lot["expiry_date"]] for lot in data.expired_items))
+    yield PageBreak()
+
+    # --- Profit/Loss Report ---
+    yield Paragraph("Profit/Loss Report", styles['Heading2'])
+    yield from chart("profit")
+    yield Table([
+        ["Total Revenue (₹)", f"{data.total_revenue:.2f}"],
+        ["Total Cost (₹)", f"{data.total_cost:.2f}"],
+        ["Net Profit (₹)", f"{data.net_profit:.2f}"]
+    ], hAlign='LEFT')
+    yield PageBreak()
+
+    # --- Peak Hour Report ---
+    yield Paragraph("Peak Hour Report", styles['Heading2'])
+    yield from chart("peak_hour")
+    yield from table_chunks(["Hour", "Orders"], ([hour, data.hour_counts[hour]] for hour in sorted(data.hour_counts)))
+
+
+def build_report_pdf(filename, data, inventory, charts):
+    """Lay out the report PDF; `charts` maps section -> (png bytes, figsize in inches)"""
+    doc = SimpleDocTemplate(filename, pagesize=A4)
+    doc.build(FlowableStream(report_flowables(data, inventory, charts)))
+    return filename
+
+
+def export_report_pdf(pool, filename, data, inventory):
+    """Render the charts in parallel on `pool`, then build the PDF there; blocks until it is written"""
+    specs = report_chart_specs(data, inventory)
+    futures = [(section, figsize, pool.submit(render_chart_png, figsize, *rest))
+               for section, figsize, *rest in specs]
+    charts = {section: (future.result(), figsize) for section, figsize, future in futures}
+    return pool.submit(build_report_pdf, filename, data, inventory, charts).result()
+
+
+# --- Data exchange ---
+# CSV / JSON Lines export and import of orders (one row per order line), menu
+# and inventory. Files ending in .gz are gzip-compressed. Both directions are
+# generators, so a large extract is never held in memory as a whole.
+
+ORDER_LINE_FIELDS = ["order_id", "datetime", "status", "item_id", "name", "price", "quantity", "total"]
+EXCHANGE_FIELDS = {"orders": ORDER_LINE_FIELDS, "menu": MENU_FIELDS, "inventory": INVENTORY_FIELDS}
+EXCHANGE_FILETYPES = [("CSV", "*.csv"), ("CSV (gzip)", "*.csv.gz"),
+                      ("JSON Lines", "*.jsonl"), ("JSON Lines (gzip)", "*.jsonl.gz")]
+IMPORT_BATCH = 2000  # records validated and written per step of an import
+
+
+def exchange_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".jsonl"):
+        return "jsonl"
+    raise ValueError("File name must end in .csv or .jsonl (optionally .gz)")
+
+
+def open_exchange_file(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def write_records(path, fields, records):
+    """Stream dict records to CSV or JSON Lines; returns the number written"""
+    fmt = exchange_format(path)
+    count = 0
+    with open_exchange_file(path, "w") as file:
+        if fmt == "csv":
+            writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records:
+                file.write(json.dumps({field: record.get(field) for field in fields}) + "\n")
+                count += 1
+    return count
+
+
+def read_records(path):
+    """Yield raw dict records from a CSV or JSON Lines file (CSV values are strings)"""
+    fmt = exchange_format(path)
+    with open_exchange_file(path, "r") as file:
+        if fmt == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line_no, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        yield {"_error": f"line {line_no}: not valid JSON"}
+
+
+def iter_order_lines(orders, archive):
+    """Every order line, archived months first, as flat ORDER_LINE_FIELDS dicts"""
+    for ts, order_id, item_id, quantity, price, name, status in archive.iter_lines():
+        yield {"order_id": order_id, "datetime": from_epoch(ts), "status": status, "item_id": item_id,
+               "name": name, "price": price, "quantity": quantity, "total": quantity * price}
+    for order in orders:
+        for item in order.get("items", []):
+            yield {"order_id": order.get("id"), "datetime": order.get("datetime", ""),
+                   "status": order.get("status", ""), "item_id": item.get("id"), "name": item.get("name", ""),
+                   "price": item.get("price", 0), "quantity": item.get("quantity", 0),
+                   "total": item.get("total", 0)}
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def _check_row(row):
+    if "_error" in row:
+        raise ValueError(row["_error"])
+
+
+def parse_menu_item(row):
+    _check_row(row)
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("menu item has no name")
+    return {"id": int(row["id"]), "name": name, "price": float(row["price"]),
+            "category": str(row.get("category") or ""), "available": _parse_bool(row.get("available", True))}
+
+
+def parse_inventory_item(row):
+    _check_row(row)
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("inventory item has no name")
+    item = {field: row[field] for field in INVENTORY_FIELDS if row.get(field) not in (None, "")}
+    item["id"] = int(row["id"])
+    item["name"] = name
+    for field in ("quantity", "threshold", "supplier_price", "unit_price"):
+        item[field] = float(item.get(field, 0))
+    item["expiry_date"] = normalize_date(item.get("expiry_date", ""))
+    ensure_lots(item)  # the imported quantity becomes a single lot
+    return item
+
+
+def parse_order(lines):
+    """Build one order dict from its raw lines, rejecting the whole order if any line is invalid"""
+    first = lines[0]
+    _check_row(first)
+    order_id = int(first["order_id"])
+    when = str(first.get("datetime") or "")
+    to_epoch(when)  # validates the timestamp format
+    items = []
+    for line in lines:
+        _check_row(line)
+        quantity = int(float(line["quantity"]))
+        price = float(line["price"])
+        if quantity <= 0 or price < 0:
+            raise ValueError(f"order {order_id}: bad quantity or price")
+        items.append({"id": int(line["item_id"]), "name": str(line.get("name") or ""), "price": price,
+                      "quantity": quantity, "total": quantity * price})
+    return {"id": order_id, "datetime": when, "items": items, "total": sum(item["total"] for item in items),
+            "status": str(first.get("status") or "Completed")}
+
+
+def group_order_lines(rows):
+    """Lists of consecutive raw rows sharing an order_id (exports keep an order's lines together)"""
+    for _, lines in itertools.groupby(rows, key=lambda row: str(row.get("order_id", ""))):
+        yield list(lines)
+
+
+def parsed_batches(records, parse, rejected, batch=IMPORT_BATCH):
+    """Validate `records` with `parse` and yield lists of up to `batch` good ones.
+
+    Rejected records are counted in rejected["count"] and the first few
+    reasons kept in rejected["errors"].
+    """
+    good = []
+    for record in records:
+        try:
+            good.append(parse(record))
+        except (KeyError, TypeError, ValueError) as e:
+            rejected["count"] += 1
+            if len(rejected["errors"]) < 5:
+                rejected["errors"].append(f"missing field {e}" if isinstance(e, KeyError) else str(e))
+            continue
+        if len(good) >= batch:
+            yield good
+            good = []
+    if good:
+        yield good
+
+
+# --- Change notifications ---
+
+class ChangeBus:
+    """Synchronous publish/subscribe from the data layer to the views; UI thread only.
+
+    Topics: "order_placed" (order=), "inventory_changed" (record= or deleted_id=)
+    and "orders_reloaded" (no payload) after bulk changes such as imports.
+    """
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, topic, callback):
+        self.subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic, **payload):
+        for callback in self.subscribers.get(topic, ()):
+            callback(**payload)
+
+
+def is_low_stock(item):
+    return item.get("status", "") == "Low Stock" or float(item.get("quantity", 0)) < float(item.get("threshold", 0))
+
+
+class DashboardCounters:
+    """Dashboard figures updated in O(1) per change instead of rescanning orders and inventory"""
+    def __init__(self, recent=10):
+        self.recent = deque(maxlen=recent)  # newest first
+        self.day = ""
+        self.today_sales = 0.0
+        self.total_orders = 0
+        self.stock = {}  # item id -> quantity
+        self.total_stock = 0.0
+        self.low_stock = set()
+
+    def reset(self, day, today_sales, total_orders, inventory, recent):
+        self.day = day
+        self.today_sales = today_sales
+        self.total_orders = total_orders
+        self.stock = {item["id"]: float(item.get("quantity", 0)) for item in inventory}
+        self.total_stock = sum(self.stock.values())
+        self.low_stock = {item["id"] for item in inventory if is_low_stock(item)}
+        self.recent.clear()
+        self.recent.extend(recent)
+
+    def order_placed(self, order):
+        day = order.get("datetime", "")[:10]
+        if day > self.day:
+            self.day, self.today_sales = day, 0.0
+        if day == self.day:
+            self.today_sales += order.get("total", 0)
+        self.total_orders += 1
+        self.recent.appendleft(order)
+
+    def inventory_changed(self, record=None, deleted_id=None):
+        if deleted_id is not None:
+            self.total_stock -= self.stock.pop(deleted_id, 0.0)
+            self.low_stock.discard(deleted_id)
+        if record is not None:
+            quantity = float(record.get("quantity", 0))
+            self.total_stock += quantity - self.stock.get(record["id"], 0.0)
+            self.stock[record["id"]] = quantity
+            if is_low_stock(record):
+                self.low_stock.add(record["id"])
+            else:
+                self.low_stock.discard(record["id"])
+
+    def sales_on(self, day):
+        return self.today_sales if day == self.day else 0.0
+
+
+class AnimatedButton(tb.Button):
+    """Button with hover animation"""
+    def __init__(self, *args, **kwargs):
+        self.default_bg = kwargs.get("bootstyle", "primary")
+        super().__init__(*args, **kwargs)
+        self.default_fg = "white" if self.default_bg in ["primary", "secondary", "success", "info", "warning", "danger"] else "black"
+        self.bind("<Enter>", self.on_enter)
+        self.bind("<Leave>", self.on_leave)
+        
+    def on_enter(self, e):
+        self.configure(bootstyle=f"{self.default_bg}-outline")
+        
+    def on_leave(self, e):
+        self.configure(bootstyle=self.default_bg)
+
+
+def _stable_positions(positions):
+    """Indexes into `positions` of a longest increasing run (rows that can stay where they are)"""
+    tails, tail_at, previous = [], [], [None] * len(positions)
+    for i, position in enumerate(positions):
+        k = bisect.bisect_left(tails, position)
+        if k == len(tails):
+            tails.append(position)
+            tail_at.append(i)
+        else:
+            tails[k] = position
+            tail_at[k] = i
+        previous[i] = tail_at[k - 1] if k else None
+    stable = set()
+    i = tail_at[-1] if tail_at else None
+    while i is not None:
+        stable.add(i)
+        i = previous[i]
+    return stable
+
+
+class TreeSync:
+    """Keeps a Treeview in step with a list of records, using record ids as iids.
+
+    update() diffs against what is on screen and only inserts, changes, moves or
+    deletes the rows that differ, so selection and scroll position survive.
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}   # iid -> (values, tags) as shown
+        self.order = []  # iids top to bottom
+
+    def update(self, rows):
+        """rows: (record id, values, tags) in display order"""
+        tree = self.tree
+        shown = {}
+        order = []
+        for key, values, tags in rows:
+            iid = str(key)
+            row = (tuple(values), tuple(tags))
+            old = self.rows.get(iid)
+            if old is None:
+                tree.insert("", "end", iid=iid, values=row[0], tags=row[1])
+            elif old != row:
+                tree.item(iid, values=row[0], tags=row[1])
+            shown[iid] = row
+            order.append(iid)
+        gone = [iid for iid in self.rows if iid not in shown]
+        if gone:
+            tree.delete(*gone)
+        # New rows went to the end; move only the rows that are out of place
+        current = [iid for iid in self.order if iid in shown]
+        current += [iid for iid in order if iid not in self.rows]
+        if current != order:
+            selected = [iid for iid in tree.selection() if iid in shown]
+            position = {iid: i for i, iid in enumerate(current)}
+            stable = _stable_positions([position[iid] for iid in order])
+            for i, iid in enumerate(order):
+                if i not in stable:
+                    tree.detach(iid)  # so the index below does not count the row itself
+                    tree.move(iid, "", tree.index(order[i - 1]) + 1 if i else 0)
+            tree.selection_set(selected)
+        self.rows = shown
+        self.order = order
+
+VIRTUAL_PAGE_SIZE = 200   # rows a VirtualTable asks its source for at a time
+VIRTUAL_PAGE_CACHE = 8    # pages a VirtualTable keeps while scrolling
+SEARCH_DEBOUNCE_MS = 150  # pause in typing before a table search runs
+
+
+class RecordSource:
+    """VirtualTable rows from an in-memory list; query() filters and sorts it, rows() slices the result"""
+    def __init__(self, records, row):
+        self.records = records  # () -> the current list of records
+        self.row = row          # record -> (values, tags)
+        self.view = []
+
+    @staticmethod
+    def sort_key(value):
+        if isinstance(value, (int, float)):
+            return (0, value, "")
+        return (1, 0, str(value).lower())
+
+    def query(self, sort=None, descending=False, text=""):
+        """Rebuild the filtered, sorted view; returns its length"""
+        text = text.strip().lower()
+        records = self.records()
+        if text:
+            records = [record for record in records
+                       if any(text in str(value).lower() for value in self.row(record)[0])]
+        else:
+            records = list(records)
+        if sort is not None:
+            records.sort(key=lambda record: self.sort_key(record.get(sort, "")), reverse=descending)
+        self.view = records
+        return len(records)
+
+    def rows(self, start, stop):
+        return [(record["id"],) + tuple(self.row(record)) for record in self.view[start:stop]]
+
+
+class InventoryIndex:
+    """Inventory records with maintained column indexes; the inventory tab's VirtualTable source.
+
+    Hashed indexes (value -> ids) answer the category, supplier and status
+    filters, a set tracks items below threshold, and a sorted (key, id) list per
+    column is built the first time the table is sorted on it. update() and
+    remove() keep all of them current, so a query costs O(matches) plus sorting
+    the matches, not a scan and sort of the whole inventory.
+    """
+    HASHED = ("category", "supplier_name", "status")
+
+    def __init__(self, inventory=(), row=None, expiring=None):
+        self.row = row            # record -> (values, tags)
+        self.expiring = expiring  # days -> ids of items with a lot expiring within them
+        self.records = {}
+        self.indexed = {}  # id -> {column: value} as last indexed (records may be edited in place)
+        self.hashed = {column: {} for column in self.HASHED}
+        self.low = set()
+        self.sorted = {}   # column -> [(sort key, id)], ascending
+        self.filters = {}  # HASHED column -> value, "below_threshold" -> bool, "expiring_days" -> int
+        self.view = []
+        self.descending = False
+        for item in inventory:
+            self.update(item)
+
+    def update(self, record):
+        item_id = record["id"]
+        old = self.indexed.get(item_id)
+        new = {column: record.get(column, "") for column in INVENTORY_FIELDS}
+        self.records[item_id] = record
+        self.indexed[item_id] = new
+        for column in self.HASHED:
+            if old is None or old[column] != new[column]:
+                if old is not None:
+                    self._unhash(column, old[column], item_id)
+                self.hashed[column].setdefault(new[column], set()).add(item_id)
+        for column, keys in self.sorted.items():
+            if old is None or old[column] != new[column]:
+                if old is not None:
+                    del keys[bisect.bisect_left(keys, (RecordSource.sort_key(old[column]), item_id))]
+                bisect.insort(keys, (RecordSource.sort_key(new[column]), item_id))
+        if is_low_stock(record):
+            self.low.add(item_id)
+        else:
+            self.low.discard(item_id)
+
+    def remove(self, item_id):
+        old = self.indexed.pop(item_id, None)
+        if old is None:
+            return
+        del self.records[item_id]
+        for column in self.HASHED:
+            self._unhash(column, old[column], item_id)
+        for column, keys in self.sorted.items():
+            del keys[bisect.bisect_left(keys, (RecordSource.sort_key(old[column]), item_id))]
+        self.low.discard(item_id)
+
+    def _unhash(self, column, value, item_id):
+        ids = self.hashed[column][value]
+        ids.discard(item_id)
+        if not ids:
+            del self.hashed[column][value]
+
+    def _sorted(self, column):
+        if column not in self.sorted:
+            self.sorted[column] = sorted((RecordSource.sort_key(values[column]), item_id)
+                                         for item_id, values in self.indexed.items())
+        return self.sorted[column]
+
+    def values(self, column):
+        """Distinct non-empty values of a hashed column, for the filter choices"""
+        return sorted(str(value) for value in self.hashed[column] if value != "")
+
+    def query(self, sort=None, descending=False, text=""):
+        sets = [self.hashed[column].get(value, set()) for column, value in self.filters.items()
+                if column in self.HASHED]
+        if self.filters.get("below_threshold"):
+            sets.append(self.low)
+        if self.filters.get("expiring_days") is not None:
+            sets.append(self.expiring(self.filters["expiring_days"]))
+        matches = None
+        if sets:
+            sets.sort(key=len)
+            matches = sets[0].intersection(*sets[1:])
+        text = text.strip().lower()
+        if text:
+            matches = {item_id for item_id in (self.records if matches is None else matches)
+                       if any(text in str(value).lower() for value in self.row(self.records[item_id])[0])}
+        column = sort or "id"
+        if matches is None:
+            self.view = self._sorted(column)
+        elif column in self.sorted and len(matches) * 8 > len(self.records):
+            keys = self.sorted[column]
+            self.view = [pair for pair in keys if pair[1] in matches]
+        else:
+            self.view = sorted((RecordSource.sort_key(self.indexed[item_id][column]), item_id)
+                               for item_id in matches)
+        self.descending = descending
+        return len(self.view)
+
+    def rows(self, start, stop):
+        if self.descending:
+            count = len(self.view)
+            pairs = self.view[max(count - stop, 0):max(count - start, 0)][::-1]
+        else:
+            pairs = self.view[start:stop]
+        return [(item_id,) + tuple(self.row(self.records[item_id])) for _, item_id in pairs]
+
+
+class OrderHistorySource:
+    """VirtualTable rows for an OrderHistoryIndex query; `filters` are OrderHistoryIndex.query() arguments"""
+    def __init__(self, row):
+        self.row = row  # order dict -> values
+        self.index = None
+        self.filters = {}
+        self.matches = []
+
+    def query(self, sort=None, descending=False, text=""):
+        if self.index is None:
+            self.matches = []
+            return 0
+        if sort == "total":
+            self.matches = self.index.query_by_total(descending, **self.filters)
+            return len(self.matches)
+        matches = self.index.query(**self.filters)  # newest first
+        if sort == "id":
+            matches = sorted(matches, key=self.index.ids.__getitem__, reverse=descending)
+        elif sort == "datetime" and not descending:
+            matches = matches[::-1]
+        self.matches = matches
+        return len(matches)
+
+    def rows(self, start, stop):
+        orders = (self.index.order(position) for position in self.matches[start:stop])
+        return [(order["id"], self.row(order), ()) for order in orders]
+
+
+class VirtualTable(tb.Frame):
+    """Treeview that holds only the rows in view, paging them in from a source while scrolling.
+
+    The source answers query(sort, descending, text) -> row count and
+    rows(start, stop) -> [(key, values, tags)], so sorting and filtering run in
+    the source (a list, an index, a query) rather than in Tk.
+    """
+    def __init__(self, master, source, columns, height=15, width=120, striped=False, search=True, **kwargs):
+        super().__init__(master, **kwargs)
+        self.source = source
+        self.columns = [column for column, _ in columns]
+        self.headings = dict(columns)
+        self.visible = height
+        self.offset = 0
+        self.count = 0
+        self.sort_column = None
+        self.descending = False
+        self.text = ""
+        self.striped = striped
+        self.pages = OrderedDict()  # page number -> rows, least recently used first
+        self._search_job = None
+
+        if search:
+            bar = tb.Frame(self, bootstyle="light")
+            bar.pack(fill="x", pady=(0, 5))
+            tb.Label(bar, text="🔍 Search:", bootstyle="primary").pack(side="left")
+            self.search_var = tk.StringVar()
+            tb.Entry(bar, textvariable=self.search_var).pack(side="left", fill="x", expand=True, padx=5)
+            self.search_var.trace_add("write", lambda *_: self._schedule_search())
+
+        body = tb.Frame(self, bootstyle="light")
+        body.pack(fill="both", expand=True)
+        self.tree = tb.Treeview(body, columns=self.columns, show="headings", height=height, bootstyle="info")
+        for column, heading in columns:
+            self.tree.heading(column, text=heading, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor="center")
+        # The scrollbar moves the window over the source, not the Treeview itself
+        self.scrollbar = tb.Scrollbar(body, orient="vertical", command=self._on_scrollbar, bootstyle="primary-round")
+        hscroll = tb.Scrollbar(body, orient="horizontal", command=self.tree.xview, bootstyle="primary-round")
+        self.tree.configure(xscrollcommand=hscroll.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        hscroll.grid(row=1, column=0, sticky="ew")
+        body.grid_rowconfigure(0, weight=1)
+        body.grid_columnconfigure(0, weight=1)
+        if striped:
+            self.tree.tag_configure("even", background="#f7f7f7")
+            self.tree.tag_configure("odd", background="#e3eafc")
+        self.rows = TreeSync(self.tree)
+
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        self.tree.bind("<Up>", self._on_arrow)
+        self.tree.bind("<Down>", self._on_arrow)
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.visible) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll(self.visible) or "break")
+        self.tree.bind("<Configure>", self._on_resize)
+
+    def refresh(self):
+        """Re-run the query (the data, sort or filter changed) and redraw the rows in view"""
+        self.count = self.source.query(self.sort_column, self.descending, self.text)
+        self.pages.clear()
+        self._render()
+
+    def sort_by(self, column):
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            self.sort_column, self.descending = column, False
+        for name in self.columns:
+            arrow = (" ▼" if self.descending else " ▲") if name == column else ""
+            self.tree.heading(name, text=self.headings[name] + arrow)
+        self.offset = 0
+        self.refresh()
+
+    def set_filter(self, text):
+        self.text = text
+        self.offset = 0
+        self.refresh()
+
+    def _schedule_search(self):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        self.set_filter(self.search_var.get())
+
+    def scroll(self, rows):
+        self.offset += rows
+        self._render()
+
+    def _page(self, number):
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+        start = number * VIRTUAL_PAGE_SIZE
+        page = self.pages[number] = self.source.rows(start, start + VIRTUAL_PAGE_SIZE)
+        if len(self.pages) > VIRTUAL_PAGE_CACHE:
+            self.pages.popitem(last=False)
+        return page
+
+    def window(self):
+        """(position, row) for the rows currently in view"""
+        start, stop = self.offset, min(self.offset + self.visible, self.count)
+        rows = []
+        if stop > start:
+            for number in range(start // VIRTUAL_PAGE_SIZE, (stop - 1) // VIRTUAL_PAGE_SIZE + 1):
+                base = number * VIRTUAL_PAGE_SIZE
+                page = self._page(number)[max(start - base, 0):stop - base]
+                rows.extend(enumerate(page, start=max(start, base)))
+        return rows
+
+    def _render(self):
+        self.offset = max(0, min(self.offset, self.count - self.visible))
+        if self.striped:
+            rows = ((key, values, tuple(tags) + ("even" if position % 2 == 0 else "odd",))
+                    for position, (key, values, tags) in self.window())
+        else:
+            rows = (row for _, row in self.window())
+        self.rows.update(rows)
+        if self.count > self.visible:
+            self.scrollbar.set(self.offset / self.count, (self.offset + self.visible) / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * self.count)
+        elif unit == "pages":
+            self.offset += int(amount) * self.visible
+        else:
+            self.offset += int(amount)
+        self._render()
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.num == 4 or event.delta > 0 else 3)
+        return "break"
+
+    def _on_arrow(self, event):
+        """Scroll by a row when the focus is about to leave the window"""
+        children = self.tree.get_children()
+        if not children:
+            return None
+        step = -1 if event.keysym == "Up" else 1
+        edge = 0 if step < 0 else -1
+        if self.tree.focus() != children[edge] or not 0 <= self.offset + step <= self.count - self.visible:
+            return None
+        self.scroll(step)
+        target = self.tree.get_children()[edge]
+        self.tree.focus(target)
+        self.tree.selection_set(target)
+        return "break"
+
+    def _on_resize(self, event):
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - 25) // rowheight)  # less the heading row
+        if visible != self.visible:
+            self.visible = visible
+            self._render()
+
 
 class CanteenManagementSystem:
     def __init__(self, root):
@@ -149,28 +2958,294 @@ class CanteenManagementSystem:
         self.style.configure("light.TFrame", background=self.style.colors.light)
         
         # Load data
-        self.menu_items = self.load_data("menu.json", self.default_menu())
-        self.orders = self.load_data("orders.json", [])
-        self.inventory = self.load_data("inventory.json", DEFAULT_INVENTORY)
+        self.data_versions = {"menu": 0, "inventory": 0, "orders": 0}  # bumped on every change
+        self.store = WriteBehindStore(open_store())
+        self.executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="canteen-reports")
+        self._pending_tasks = []  # (future, on_done) polled from the Tk loop
+        self._dashboard_job = None
+        self._history_job = None
+        self._export_job = None
+        self.export_pool = None  # started on the first PDF export
+        self.menu_items = MenuCatalog(self.store.load("menu", self.default_menu()))
+        self.order_index = OrderIndex(self.store.load("orders", []))
+        self.orders = self.order_index.orders
+        self.inventory = self.store.load("inventory", DEFAULT_INVENTORY)
+        self.archive = OrderArchive()
+        self.seal_closed_months()
+        self.recipe_book = RecipeBook()
+        if not self.recipe_book.load():
+            self.recipe_book.seed(self.default_recipes())
+            self.store.write_file(RECIPES_FILE, self.recipe_book.snapshot)
+            self.store.commit()
+        self.rollups = SalesRollups()
+        rollups_stale = not self.rollups.load() or not self.rollups_match(self.rollups)
         self.ensure_inventory_fields()
+        self.expiry_index = ExpiryIndex(self.inventory)
+        self.stock_ledger = StockLedger()
+        ledger_missing = not self.stock_ledger.load()
+        if ledger_missing and not rollups_stale:
+            self.seed_stock_ledger()
+        # Indexes and views follow data changes through the bus instead of rescanning
+        self.bus = ChangeBus()
+        self.dashboard = DashboardCounters()
+        self.bus.subscribe("inventory_changed", self._index_expiry)
+        self.inventory_index = InventoryIndex(self.inventory, self._inventory_row,
+                                              self.expiry_index.items_expiring_within)
+        self.bus.subscribe("inventory_changed", self._inventory_index_changed)
+        self.bus.subscribe("inventory_changed", self.dashboard.inventory_changed)
+        self.bus.subscribe("inventory_changed", self._dashboard_inventory_changed)
+        self.bus.subscribe("order_placed", self.dashboard.order_placed)
+        self.bus.subscribe("order_placed", self._dashboard_order_placed)
+        self.bus.subscribe("orders_reloaded", self.resync_dashboard)
+        self.history_index = None  # built on a worker the first time History is opened
+        self.bus.subscribe("order_placed", self._history_order_placed)
+        self.bus.subscribe("orders_reloaded", self._history_reloaded)
 
         # Setup UI
+        self.current_section = None
         self.setup_ui()
         self.show_frame(0)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._save_failing = False
+        self.root.after(PERSIST_CHECK_MS, self._check_persistence)
+        self.compiled_recipes()
+        if rollups_stale:
+            # e.g. after a crash: rebuilt from the full history on a worker
+            self.rebuild_rollups(then=self.seed_stock_ledger if ledger_missing else None)
+        if self.recipe_book.problems:
+            messagebox.showwarning("Recipes", f"Some lines in {RECIPES_FILE} were skipped:\n"
+                                   + "\n".join(self.recipe_book.problems[:10]))
+
+    def on_close(self):
+        """Flush pending writes before the window goes away"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.export_pool is not None:
+            self.export_pool.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+        self.stock_ledger.close()
+        self.archive.close()
+        self.root.destroy()
+
+    def closed_months(self):
+        """Start the current month as the live one; returns {month: live orders} from the months before it"""
+        self.live_month = datetime.now().strftime("%Y-%m")
+        closed = {}
+        for order in self.order_index.between(end=day_start_epoch(self.live_month + "-01")):
+            month = order.get("datetime", "")[:7]
+            if month and month < self.live_month:
+                closed.setdefault(month, []).append(order)
+        return closed
+
+    def seal_closed_months(self):
+        """Move orders from months before the current one into the columnar archive (at startup)"""
+        closed = self.closed_months()
+        if closed:
+            self.seal_months(closed)
+            self.drop_sealed(closed)
+
+    def roll_over_month(self):
+        """First checkout of a new month: seal the month(s) before it on a worker"""
+        closed = self.closed_months()
+        if not closed:
+            return
 
-    def load_data(self, filename, default_data):
-        if os.path.exists(filename):
+        def done(future):
             try:
-                with open(filename, 'r') as file:
-                    data = json.load(file)
-                    return data
-            except Exception:
-                return default_data
-        return default_data
+                future.result()
+            except Exception as e:
+                # the orders stay live; the next start tries again
+                messagebox.showerror("Archive", f"Failed to archive last month's orders: {e}")
+                return
+            self.drop_sealed(closed)
+            self.data_versions["orders"] += 1
+            self.bus.publish("orders_reloaded")
 
-    def save_data(self, filename, data):
-        with open(filename, 'w') as file:
-            json.dump(data, file, indent=4)
+        self.submit_task(self.seal_months, done, closed)
+
+    def drop_sealed(self, closed):
+        """Take the orders of sealed months out of the store and the live index"""
+        for orders in closed.values():
+            for order in orders:
+                self.store.delete("orders", order.get("id"))
+        self.store.commit()
+        self.order_index = OrderIndex(order for order in self.orders
+                                      if order.get("datetime", "")[:7] not in closed)
+        self.orders = self.order_index.orders
+
+    def seal_months(self, closed):
+        """Merge {month: orders} into the archive, one rewrite per month; runs on a worker"""
+        for month, orders in sorted(closed.items()):
+            self.archive.seal(month, orders)
+
+    def compiled_recipes(self):
+        return self.recipe_book.compile(self.inventory)
+
+    # --- Background work ---
+    # Workers never touch Tk: they get plain snapshots of the data and their
+    # results are handed back to `on_done` from the Tk loop.
+    def submit_task(self, func, on_done, *args):
+        """Run func(*args) on the worker pool; on_done(future) is called on the UI thread"""
+        future = self.executor.submit(func, *args)
+        if not self._pending_tasks:
+            self.root.after(TASK_POLL_MS, self._poll_tasks)
+        self._pending_tasks.append((future, on_done))
+        return future
+
+    def _poll_tasks(self):
+        tasks, self._pending_tasks = self._pending_tasks, []
+        finished = []
+        for future, on_done in tasks:
+            if future.done():
+                finished.append((future, on_done))
+            else:
+                self._pending_tasks.append((future, on_done))
+        if self._pending_tasks:
+            self.root.after(TASK_POLL_MS, self._poll_tasks)
+        for future, on_done in finished:
+            if not future.cancelled():
+                on_done(future)  # may submit more work
+
+    def _check_persistence(self):
+        """Report write-behind failures once per outage, and again when saving works"""
+        error = self.store.last_error
+        if error is not None and not self._save_failing:
+            self._save_failing = True
+            messagebox.showerror("Save Failed", f"Changes could not be written to disk: {error}\n\n"
+                                 "They are kept and retried in the background.")
+        elif error is None and self._save_failing:
+            self._save_failing = False
+            messagebox.showinfo("Saved", "Pending changes have been written to disk.")
+        self.root.after(PERSIST_CHECK_MS, self._check_persistence)
+
+    def rollups_match(self, rollups):
+        last_order_id = max([o.get("id", 0) for o in self.orders] + [self.archive.max_order_id()])
+        return rollups.matches(len(self.orders) + self.archive.order_count(), last_order_id)
+
+    def rebuild_rollups(self, then=None):
+        """Rebuild the report rollups from the full history on a worker and swap them in.
+
+        Orders placed meanwhile are folded in afterwards; `then()` runs once the
+        rebuilt rollups are in place but before those orders are added.
+        """
+        orders = list(self.orders)
+        recipes = self.compiled_recipes()
+
+        def build():
+            rollups = SalesRollups()
+            rollups.rebuild(orders, self.archive, recipes)
+            return rollups
+
+        def done(future):
+            try:
+                rollups = future.result()
+            except Exception as e:
+                messagebox.showerror("Rollups", f"Failed to rebuild report rollups: {e}")
+                return
+            self.rollups = rollups
+            if then is not None:
+                then()
+            known = {order.get("id") for order in orders}
+            recipes = self.compiled_recipes()
+            for order in self.orders:
+                if order.get("id") not in known:
+                    rollups.apply_order(order, recipes)
+            if not self.rollups_match(rollups):
+                self.rebuild_rollups()  # history changed under us (e.g. an import); go again
+                return
+            self.data_versions["orders"] += 1
+            self.store.write_file(ROLLUPS_FILE, rollups.snapshot)
+            self.store.commit()
+            self.bus.publish("orders_reloaded")
+
+        self.submit_task(build, done)
+
+    def verify_rollups(self):
+        """Compare the report rollups against a full rescan on a worker and rebuild them on mismatch"""
+        orders, epochs = list(self.orders), list(self.order_index.epochs)
+        inventory, recipes = copy.deepcopy(self.inventory), self.compiled_recipes()
+
+        def compare():
+            fresh = ReportAggregates.compute(orders, self.archive, inventory, recipes, epochs)
+            return ReportAggregates.from_rollups(self.rollups, inventory, recipes).differences(fresh)
+
+        def done(future):
+            try:
+                mismatched = future.result()
+            except Exception as e:
+                messagebox.showerror("Rollups", f"Failed to verify report rollups: {e}")
+                return
+            if not mismatched:
+                messagebox.showinfo("Rollups", "Report rollups match the order history.")
+                return
+            self.rebuild_rollups()
+            messagebox.showwarning("Rollups", f"Rebuilding report rollups (mismatched: {', '.join(mismatched)}).")
+
+        self.submit_task(compare, done)
+
+    def seed_stock_ledger(self):
+        """First start: back-fill daily sales usage from the rollups, opening with the balance that leads to today's stock.
+
+        Movements already in the ledger (when seeding waited for a rollups
+        rebuild) are allowed for in the opening balance.
+        """
+        by_name = {}
+        for item in self.inventory:
+            by_name.setdefault(item["name"], item)
+        records, sold = [], {}
+        with self.rollups.lock:
+            for day in self.rollups.sorted_days:
+                for name, qty in self.rollups.days[day].get("usage", {}).items():
+                    if name in by_name and qty:
+                        item_id = by_name[name]["id"]
+                        records.append({"ts": day_start_epoch(day), "item": item_id, "kind": "sale",
+                                        "qty": -qty, "ref": "history"})
+                        sold[item_id] = sold.get(item_id, 0) + qty
+        opening = min((record["ts"] for record in records), default=now_epoch()) - 1
+        for item in self.inventory:
+            quantity = float(item.get("quantity", 0)) - self.stock_ledger.balance_at(item["id"])
+            records.append({"ts": opening, "item": item["id"], "kind": "adjust",
+                            "qty": quantity + sold.get(item["id"], 0), "ref": "opening balance"})
+        self.stock_ledger.backfill(records)
+        self.store.append_file(STOCK_LEDGER_FILE, self.stock_ledger.write_pending)
+        self.store.commit()
+
+    def log_stock(self, item_id, old_quantity, new_quantity, ref):
+        """Record a manual change of one item's quantity ("receipt" when it went up)"""
+        delta = float(new_quantity) - float(old_quantity)
+        self.record_stock([(item_id, "receipt" if delta > 0 else "adjust", delta, ref)])
+
+    def record_stock(self, movements):
+        """Add movements to the stock ledger; the write-behind thread appends them to its file"""
+        self.stock_ledger.record(movements)
+        self.store.append_file(STOCK_LEDGER_FILE, self.stock_ledger.write_pending)
+        self.store.commit()
+
+    def persist(self, dataset, record=None, deleted_id=None):
+        """Write one changed record (and/or one deletion) to the store as a single transaction and announce it"""
+        self.data_versions[dataset] += 1
+        if dataset == "inventory":
+            self.recipe_book.invalidate()  # supplier prices or names may have changed
+        if deleted_id is not None:
+            self.store.delete(dataset, deleted_id)
+        if record is not None:
+            self.store.upsert(dataset, record)
+        self.store.commit()
+        if dataset == "inventory":
+            self.bus.publish("inventory_changed", record=record, deleted_id=deleted_id)
+
+    def default_recipes(self):
+        """RECIPE_MAP recipes for the default menu items still on the menu, limited to stocked ingredients"""
+        defaults = {item["id"]: item["name"] for item in self.default_menu()}
+        stocked = {item["name"] for item in self.inventory}
+        recipes = {}
+        for menu_id, recipe in RECIPE_MAP.items():
+            item = self.menu_items.get(menu_id)
+            if item is None or item.get("name") != defaults.get(menu_id):
+                continue  # the id belongs to a different dish here
+            lines = {name: qty for name, qty in recipe.items() if name in stocked}
+            if lines:
+                recipes[menu_id] = lines
+        return recipes
 
     def default_menu(self):
         return [
@@ -206,6 +3281,7 @@ class CanteenManagementSystem:
             ("🍽️ Menu", "success"),
             ("📦 Inventory", "info"),
             ("🛒 Orders", "warning"),
+            ("📜 History", "dark"),
             ("📊 Reports", "secondary"),
             ("⚙️ Settings", "light")
         ]
@@ -250,7 +3326,7 @@ class CanteenManagementSystem:
         self.title_label.grid(row=0, column=0, sticky="w", padx=30, pady=20)
         
         # Add refresh button
-        refresh_btn = AnimatedButton(self.header, text="🔄 Refresh", bootstyle="info", command=self.setup_dashboard_tab, cursor="hand2")
+        refresh_btn = AnimatedButton(self.header, text="🔄 Refresh", bootstyle="info", command=self.resync_dashboard, cursor="hand2")
         refresh_btn.grid(row=0, column=1, sticky="e", padx=30, pady=20)
         
         # Content area
@@ -261,7 +3337,7 @@ class CanteenManagementSystem:
         
         # Create frames for each section
         self.frames = {}
-        for section in ["Dashboard", "Menu", "Inventory", "Orders", "Reports", "Settings"]:
+        for section in ["Dashboard", "Menu", "Inventory", "Orders", "History", "Reports", "Settings"]:
             frame = tb.Frame(self.content, bootstyle="light")
             frame.grid(row=0, column=0, sticky="nsew")  # This is correct
             self.frames[section] = frame
@@ -271,12 +3347,14 @@ class CanteenManagementSystem:
         self.setup_menu_tab()
         self.setup_inventory_tab()
         self.setup_order_tab()
+        self.setup_history_tab()
         self.setup_reports_tab()
         self.setup_settings_tab()
 
     def navigate_to(self, text):
         section = text.split(" ")[1]  # Extract section name from button text
         self.title_label.configure(text=section)
+        self.current_section = section
         
         # Hide all frames
         for frame in self.frames.values():
@@ -293,6 +3371,13 @@ class CanteenManagementSystem:
         active_btn = next(btn for btn in self.sidebar_buttons if section in btn.cget("text"))
         active_btn.configure(bootstyle=f"{active_btn.default_bg}-outline")
 
+        if section == "Reports":
+            self.refresh_reports()
+        elif section == "Orders":
+            self.quick_entry.focus_set()
+        elif section == "History" and (self.history_index is None or self.history_index.stale):
+            self.build_history_index()
+
     def animate_frame(self, widget, alpha=0.0):
         """Simple fade-in animation for frames"""
         if alpha < 1.0:
@@ -301,7 +3386,7 @@ class CanteenManagementSystem:
             self.root.after(10, lambda: self.animate_frame(widget, alpha))
 
     def show_frame(self, idx):
-        sections = ["Dashboard", "Menu", "Inventory", "Orders", "Reports", "Settings"]
+        sections = ["Dashboard", "Menu", "Inventory", "Orders", "History", "Reports", "Settings"]
         self.navigate_to(f"icon {sections[idx]}")
 
     def toggle_mode(self):
@@ -344,25 +3429,18 @@ class CanteenManagementSystem:
         cards_frame = tb.Frame(scrollable_frame, bootstyle="light")
         cards_frame.pack(fill="x", padx=20, pady=10)
         
-        # Calculate stats
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_sales = sum(order.get("total", 0) for order in self.orders 
-                         if order.get("datetime", "").startswith(today))
-        available_stock = sum(float(item.get("quantity", 0)) for item in self.inventory)
-        low_stock_count = sum(1 for item in self.inventory 
-                             if item.get("status", "") == "Low Stock" or 
-                             float(item.get("quantity", 0)) < float(item.get("threshold", 0)))
-        total_orders = len(self.orders)
-        
+        # Stat cards, kept current by the change bus (see resync_dashboard)
         stats = [
-            ("Today's Sales", f"₹{today_sales:.2f}", "success", "💰"),
-            ("Total Stock", f"{available_stock:.0f} units", "info", "📦"),
-            ("Low Stock Items", f"{low_stock_count}", "danger", "⚠️"),
-            ("Total Orders", f"{total_orders}", "warning", "🛒"),
+            ("sales", "Today's Sales", "success", "💰"),
+            ("stock", "Total Stock", "info", "📦"),
+            ("low", "Low Stock Items", "danger", "⚠️"),
+            ("expiring", f"Expiring ({EXPIRY_WARNING_DAYS} days)", "secondary", "⏳"),
+            ("orders", "Total Orders", "warning", "🛒"),
         ]
+        self.dashboard_cards = {}
         
-        for i, (title, value, style, icon) in enumerate(stats):
-            card = tb.Frame(cards_frame, bootstyle=style, width=240, height=120)
+        for i, (key, title, style, icon) in enumerate(stats):
+            card = tb.Frame(cards_frame, bootstyle=style, width=200, height=120)
             card.grid(row=0, column=i, padx=10, pady=5, sticky="nsew")
             card.grid_propagate(False)
             
@@ -370,8 +3448,9 @@ class CanteenManagementSystem:
             icon_label = tb.Label(card, text=icon, font=("Arial", 24), bootstyle=f"inverse-{style}")
             icon_label.pack(pady=(15, 5))
             
-            value_label = tb.Label(card, text=value, font=("Segoe UI", 18, "bold"), bootstyle=f"inverse-{style}")
+            value_label = tb.Label(card, text="…", font=("Segoe UI", 18, "bold"), bootstyle=f"inverse-{style}")
             value_label.pack(pady=5)
+            self.dashboard_cards[key] = value_label
             
             title_label = tb.Label(card, text=title, font=("Segoe UI", 10), bootstyle=f"inverse-{style}")
             title_label.pack(pady=(0, 10))
@@ -398,17 +3477,7 @@ class CanteenManagementSystem:
         
         tree.pack(side="left", fill="both", expand=True)
         tree_scroll.pack(side="right", fill="y")
-        
-        # Populate with recent orders
-        for order in sorted(self.orders, key=lambda x: x.get("datetime", ""), reverse=True)[:10]:
-            items_text = ", ".join([f"{item['name']} (x{item['quantity']})" for item in order.get("items", [])])
-            tree.insert("", "end", values=(
-                order.get("id", ""), 
-                order.get("datetime", ""), 
-                items_text[:30] + "..." if len(items_text) > 30 else items_text,
-                f"₹{order.get('total', 0):.2f}", 
-                order.get("status", "")
-            ))
+        self.recent_orders_tree = tree
         
         # Quick actions
         tb.Label(scrollable_frame, text="Quick Actions", font=("Segoe UI", 16, "bold"), 
@@ -428,6 +3497,90 @@ class CanteenManagementSystem:
             btn = AnimatedButton(actions_frame, text=text, command=command, bootstyle=style, cursor="hand2")
             btn.grid(row=0, column=i, padx=10, pady=5, sticky="ew")
             actions_frame.grid_columnconfigure(i, weight=1)
+        self.resync_dashboard()
+
+    def resync_dashboard(self):
+        """Re-seed the dashboard counters from the rollups and inventory, then redraw it"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        with self.rollups.lock:
+            today_sales = self.rollups.days.get(today, {}).get("revenue", 0)
+            total_orders = self.rollups.order_count
+        recent = self.dashboard.recent
+        self.dashboard.reset(today, today_sales, total_orders, self.inventory, self.order_index.latest(recent.maxlen))
+        if self._dashboard_job is not None:
+            self._dashboard_job.cancel()
+            self._dashboard_job = None
+        if len(recent) < recent.maxlen and self.archive.months():
+            def top_up(future):
+                if self._dashboard_job is not future:
+                    return  # superseded by a later resync
+                self._dashboard_job = None
+                try:
+                    archived = future.result()
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to load recent orders: {e}")
+                    return
+                # Archived orders are older than anything already shown
+                for order in archived[:recent.maxlen - len(recent)]:
+                    recent.append(order)
+                self.render_dashboard()
+            self._dashboard_job = self.submit_task(self.archived_recent, top_up, recent.maxlen - len(recent))
+        self.render_dashboard()
+
+    def archived_recent(self, count):
+        """The newest `count` orders from the archive; runs on a worker"""
+        recent = []
+        for month in reversed(self.archive.months()):
+            if len(recent) >= count:
+                break
+            recent.extend(self.archive.latest(month, count - len(recent)))
+        return recent
+
+    def render_dashboard(self):
+        self._dashboard_order_cards()
+        self._dashboard_stock_cards()
+        tree = self.recent_orders_tree
+        tree.delete(*tree.get_children())
+        for order in self.dashboard.recent:
+            tree.insert("", "end", values=self._recent_order_row(order))
+
+    def _recent_order_row(self, order):
+        items_text = ", ".join([f"{item['name']} (x{item['quantity']})" for item in order.get("items", [])])
+        return (
+            order.get("id", ""), 
+            order.get("datetime", ""), 
+            items_text[:30] + "..." if len(items_text) > 30 else items_text,
+            f"₹{order.get('total', 0):.2f}", 
+            order.get("status", "")
+        )
+
+    def _dashboard_order_cards(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.dashboard_cards["sales"].configure(text=f"₹{self.dashboard.sales_on(today):.2f}")
+        self.dashboard_cards["orders"].configure(text=f"{self.dashboard.total_orders}")
+
+    def _dashboard_stock_cards(self):
+        self.dashboard_cards["stock"].configure(text=f"{self.dashboard.total_stock:.0f} units")
+        self.dashboard_cards["low"].configure(text=f"{len(self.dashboard.low_stock)}")
+        expiring = self.expiry_index.count_expiring_within(EXPIRY_WARNING_DAYS)
+        expired = self.expiry_index.count_expired()
+        self.dashboard_cards["expiring"].configure(text=f"{expiring} (+{expired} expired)" if expired else f"{expiring}")
+
+    def _dashboard_order_placed(self, order):
+        self._dashboard_order_cards()
+        tree = self.recent_orders_tree
+        tree.insert("", 0, values=self._recent_order_row(order))
+        for iid in tree.get_children()[self.dashboard.recent.maxlen:]:
+            tree.delete(iid)
+
+    def _dashboard_inventory_changed(self, record=None, deleted_id=None):
+        self._dashboard_stock_cards()
+
+    def _index_expiry(self, record=None, deleted_id=None):
+        if deleted_id is not None:
+            self.expiry_index.remove(deleted_id)
+        if record is not None:
+            self.expiry_index.update(record)
 
     # --- MENU TAB ---
     def setup_menu_tab(self):
@@ -454,43 +3607,23 @@ class CanteenManagementSystem:
             btn.grid(row=0, column=i, padx=5, pady=5, sticky="ew")
             btn_frame.grid_columnconfigure(i, weight=1)
         
-        # Menu table
-        table_frame = tb.Frame(frame, bootstyle="light")
-        table_frame.pack(fill="both", expand=True, padx=20, pady=10)
-        
-        columns = ("ID", "Name", "Price", "Category", "Available")
-        self.menu_tree = tb.Treeview(table_frame, columns=columns, show="headings", height=15, bootstyle="info")
-        
-        for col in columns:
-            self.menu_tree.heading(col, text=col)
-            self.menu_tree.column(col, width=120, anchor="center")
-        
-        # Add scrollbars
-        tree_vscroll = tb.Scrollbar(table_frame, orient="vertical", command=self.menu_tree.yview, bootstyle="primary-round")
-        tree_hscroll = tb.Scrollbar(table_frame, orient="horizontal", command=self.menu_tree.xview, bootstyle="primary-round")
-        self.menu_tree.configure(yscrollcommand=tree_vscroll.set, xscrollcommand=tree_hscroll.set)
-        
-        self.menu_tree.grid(row=0, column=0, sticky="nsew")
-        tree_vscroll.grid(row=0, column=1, sticky="ns")
-        tree_hscroll.grid(row=1, column=0, sticky="ew")
-        
-        table_frame.grid_rowconfigure(0, weight=1)
-        table_frame.grid_columnconfigure(0, weight=1)
-        
+        # Menu table: only the rows in view are in the Treeview
+        columns = [("id", "ID"), ("name", "Name"), ("price", "Price"), ("category", "Category"),
+                   ("available", "Available")]
+        source = RecordSource(lambda: self.menu_items, lambda item: ((
+            item.get("id", ""), 
+            item.get("name", ""), 
+            f"₹{item.get('price', 0):.2f}", 
+            item.get("category", ""), 
+            "Yes" if item.get("available", False) else "No"
+        ), ()))
+        self.menu_table = VirtualTable(frame, source, columns, height=15, bootstyle="light")
+        self.menu_table.pack(fill="both", expand=True, padx=20, pady=10)
+        self.menu_tree = self.menu_table.tree
         self.refresh_menu()
 
     def refresh_menu(self):
-        for item in self.menu_tree.get_children():
-            self.menu_tree.delete(item)
-        
-        for item in self.menu_items:
-            self.menu_tree.insert("", "end", values=(
-                item.get("id", ""), 
-                item.get("name", ""), 
-                f"₹{item.get('price', 0):.2f}", 
-                item.get("category", ""), 
-                "Yes" if item.get("available", False) else "No"
-            ))
+        self.menu_table.refresh()
 
     def add_menu_item(self):
         add_window = tb.Toplevel(self.root)
@@ -513,7 +3646,7 @@ class CanteenManagementSystem:
         form_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
         fields = [
-            ("ID:", "entry", str(max([item.get("id", 0) for item in self.menu_items], default=0) + 1)),
+            ("ID:", "entry", str(self.menu_items.next_id)),
             ("Name:", "entry", ""),
             ("Price:", "entry", ""),
             ("Category:", "combo", ["Main Course", "Side Dish", "Beverage", "Dessert"]),
@@ -553,8 +3686,8 @@ class CanteenManagementSystem:
                     "category": entries["category"].get(),
                     "available": entries["available"].get()
                 }
-                self.menu_items.append(new_item)
-                self.save_data("menu.json", self.menu_items)
+                self.menu_items.add(new_item)
+                self.persist("menu", new_item)
                 self.refresh_menu()
                 self.refresh_available_menu()
                 add_window.destroy()
@@ -577,7 +3710,7 @@ class CanteenManagementSystem:
             return
         
         item_id = int(self.menu_tree.item(selected[0])["values"][0])
-        item = next((x for x in self.menu_items if x.get("id", 0) == item_id), None)
+        item = self.menu_items.get(item_id)
         
         if not item:
             messagebox.showerror("Error", "Item not found")
@@ -635,12 +3768,15 @@ class CanteenManagementSystem:
         
         def update_item():
             try:
-                item["id"] = int(entries["id"].get())
-                item["name"] = entries["name"].get()
-                item["price"] = float(entries["price"].get())
-                item["category"] = entries["category"].get()
-                item["available"] = entries["available"].get()
-                self.save_data("menu.json", self.menu_items)
+                old_id = item["id"]
+                updated = dict(item)
+                updated["id"] = int(entries["id"].get())
+                updated["name"] = entries["name"].get()
+                updated["price"] = float(entries["price"].get())
+                updated["category"] = entries["category"].get()
+                updated["available"] = entries["available"].get()
+                self.menu_items.replace(old_id, updated)
+                self.persist("menu", updated, deleted_id=old_id if old_id != updated["id"] else None)
                 self.refresh_menu()
                 self.refresh_available_menu()
                 edit_window.destroy()
@@ -665,8 +3801,8 @@ class CanteenManagementSystem:
         item_id = int(self.menu_tree.item(selected[0])["values"][0])
         
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this item?"):
-            self.menu_items = [item for item in self.menu_items if item.get("id", 0) != item_id]
-            self.save_data("menu.json", self.menu_items)
+            self.menu_items.remove(item_id)
+            self.persist("menu", deleted_id=item_id)
             self.refresh_menu()
             self.refresh_available_menu()
             messagebox.showinfo("Success", "Menu item deleted successfully!")
@@ -691,6 +3827,20 @@ class CanteenManagementSystem:
         tb.Label(left_frame, text="Available Menu Items", font=("Segoe UI", 12, "bold"), 
                 bootstyle="primary").pack(pady=(0, 10))
         
+        self._build_quick_entry(left_frame)
+
+        # Category filter, answered from the catalog's category index
+        category_frame = tb.Frame(left_frame, bootstyle="light")
+        category_frame.pack(fill="x", pady=(0, 5))
+        tb.Label(category_frame, text="Category:", bootstyle="primary").pack(side="left", padx=(0, 5))
+        self.menu_category_var = tk.StringVar(value="All")
+        category_combo = tb.Combobox(category_frame, textvariable=self.menu_category_var, state="readonly",
+                                     width=16, bootstyle="primary")
+        category_combo.configure(postcommand=lambda: category_combo.configure(
+            values=["All"] + self.menu_items.categories()))
+        category_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_available_menu())
+        category_combo.pack(side="left")
+        
         # Menu items table
         menu_tree_frame = tb.Frame(left_frame, bootstyle="light")
         menu_tree_frame.pack(fill="both", expand=True)
@@ -713,6 +3863,7 @@ class CanteenManagementSystem:
         
         menu_tree_frame.grid_rowconfigure(0, weight=1)
         menu_tree_frame.grid_columnconfigure(0, weight=1)
+        self.available_menu_rows = TreeSync(self.available_menu_tree)
         
         # Right panel - Current order
         right_frame = tb.Frame(paned_window, bootstyle="light")
@@ -743,6 +3894,7 @@ class CanteenManagementSystem:
         
         order_tree_frame.grid_rowconfigure(0, weight=1)
         order_tree_frame.grid_columnconfigure(0, weight=1)
+        self.order_rows = TreeSync(self.order_tree)
         
         # Order summary and buttons
         summary_frame = tb.Frame(right_frame, bootstyle="light")
@@ -772,14 +3924,10 @@ class CanteenManagementSystem:
         self.refresh_available_menu()
 
     def refresh_order_tree(self):
-        for item in self.order_tree.get_children():
-            self.order_tree.delete(item)
-        total = 0
-        for item in self.current_order:
-            self.order_tree.insert("", "end", values=(
-                item["id"], item["name"], f"₹{item['price']:.2f}", item["quantity"], f"₹{item['total']:.2f}"
-            ))
-            total += item["total"]
+        self.order_rows.update((item["id"], (
+            item["id"], item["name"], f"₹{item['price']:.2f}", item["quantity"], f"₹{item['total']:.2f}"
+        ), ()) for item in self.current_order)
+        total = sum(item["total"] for item in self.current_order)
         self.total_var.set(f"Total: ₹{total:.2f}")
 
     def add_to_order(self):
@@ -788,7 +3936,7 @@ class CanteenManagementSystem:
             messagebox.showwarning("Warning", "Please select a menu item to add")
             return
         item_id = int(self.available_menu_tree.item(selected[0])["values"][0])
-        menu_item = next((x for x in self.menu_items if x.get("id", 0) == item_id), None)
+        menu_item = self.menu_items.get(item_id)
         if not menu_item:
             messagebox.showerror("Error", "Menu item not found")
             return
@@ -804,25 +3952,86 @@ class CanteenManagementSystem:
             if qty <= 0:
                 messagebox.showerror("Error", "Quantity must be positive")
                 return
-            # Add to current order
-            for item in self.current_order:
-                if item["id"] == menu_item["id"]:
-                    item["quantity"] += qty
-                    item["total"] = item["quantity"] * menu_item["price"]
-                    break
-            else:
-                self.current_order.append({
-                    "id": menu_item["id"],
-                    "name": menu_item["name"],
-                    "price": menu_item["price"],
-                    "quantity": qty,
-                    "total": qty * menu_item["price"]
-                })
-            self.refresh_order_tree()
+            self.add_item_to_order(menu_item, qty)
             qty_win.destroy()
         tb.Button(qty_win, text="Add", bootstyle="success", command=confirm_qty).pack(pady=5)
         tb.Button(qty_win, text="Cancel", bootstyle="secondary", command=qty_win.destroy).pack()
 
+    def add_item_to_order(self, menu_item, qty):
+        for item in self.current_order:
+            if item["id"] == menu_item["id"]:
+                item["quantity"] += qty
+                item["total"] = item["quantity"] * menu_item["price"]
+                break
+        else:
+            self.current_order.append({
+                "id": menu_item["id"],
+                "name": menu_item["name"],
+                "price": menu_item["price"],
+                "quantity": qty,
+                "total": qty * menu_item["price"]
+            })
+        self.refresh_order_tree()
+
+    def _build_quick_entry(self, parent):
+        """Keyboard order entry: type "3 veg sand" or "2x21", Enter adds, Ctrl+Enter checks out"""
+        bar = tb.Frame(parent, bootstyle="light")
+        bar.pack(fill="x", pady=(0, 10))
+        tb.Label(bar, text="Quick add:", bootstyle="primary").pack(side="left")
+        text = tk.StringVar()
+        entry = tb.Entry(bar, textvariable=text, bootstyle="primary")
+        entry.pack(side="left", fill="x", expand=True, padx=5)
+        hint = tb.Label(parent, text="e.g. 3 veg sand, 2x21 · ↑/↓ pick · Enter add · Ctrl+Enter checkout",
+                        font=("Segoe UI", 9), bootstyle="secondary")
+        hint.pack(anchor="w")
+        matches_box = tk.Listbox(parent, height=5, activestyle="none", exportselection=False)
+        matches_box.pack(fill="x", pady=(0, 10))
+        matches = []
+
+        def update_matches(*args):
+            _, query = parse_quick_entry(text.get())
+            matches[:] = self.menu_items.search(query)
+            matches_box.delete(0, "end")
+            for item in matches:
+                matches_box.insert("end", f"{item['id']:>4}  {item['name']}  ₹{item['price']:.2f}")
+            if matches:
+                matches_box.selection_set(0)
+
+        def move(step):
+            if not matches:
+                return "break"
+            current = matches_box.curselection()
+            index = min(max((current[0] if current else 0) + step, 0), len(matches) - 1)
+            matches_box.selection_clear(0, "end")
+            matches_box.selection_set(index)
+            matches_box.see(index)
+            return "break"
+
+        def add(event=None):
+            qty, _ = parse_quick_entry(text.get())
+            current = matches_box.curselection()
+            if not matches or qty <= 0:
+                entry.bell()
+                return "break"
+            self.add_item_to_order(matches[current[0] if current else 0], qty)
+            text.set("")
+            return "break"
+
+        def checkout(event=None):
+            self.checkout_order()
+            entry.focus_set()
+            return "break"
+
+        text.trace_add("write", update_matches)
+        entry.bind("<Return>", add)
+        entry.bind("<KP_Enter>", add)
+        entry.bind("<Down>", lambda e: move(1))
+        entry.bind("<Up>", lambda e: move(-1))
+        entry.bind("<Escape>", lambda e: text.set(""))
+        entry.bind("<Control-Return>", checkout)
+        matches_box.bind("<Double-Button-1>", add)
+        self.quick_entry = entry
+
     def remove_from_order(self):
         selected = self.order_tree.selection()
         if not selected:
@@ -840,8 +4049,10 @@ class CanteenManagementSystem:
         if not self.current_order:
             messagebox.showwarning("Warning", "No items in order")
             return
+        if datetime.now().strftime("%Y-%m") != self.live_month:
+            self.roll_over_month()
         # Create order record
-        order_id = max([o.get("id", 0) for o in self.orders], default=0) + 1
+        order_id = max([o.get("id", 0) for o in self.orders] + [self.archive.max_order_id()]) + 1
         total = sum(item["total"] for item in self.current_order)
         order = {
             "id": order_id,
@@ -850,10 +4061,187 @@ class CanteenManagementSystem:
             "total": total,
             "status": "Completed"
         }
-        self.orders.append(order)
-        self.save_data("orders.json", self.orders)
+        recipes = self.compiled_recipes()
+        needed = recipes.consumption(order["items"])
+        stock = {item.get("id"): item for item in self.inventory}
+        short = [f"{stock[inv_id]['name']} (need {qty:g}, have {float(stock[inv_id].get('quantity', 0)):g})"
+                 for inv_id, qty in needed.items() if qty > float(stock[inv_id].get("quantity", 0))]
+        if short and not messagebox.askyesno("Low Stock", "Not enough stock for:\n" + "\n".join(short)
+                                             + "\n\nCheck out anyway? Stock will be set to zero."):
+            return
+        # The order and every ingredient deduction are queued as one batch, so they
+        # reach the store in the same commit; in-memory stock changes only once it is queued
+        with self.store.batch():
+            self.store.append_order(order)
+            updated = self.deduct_stock(needed)
+            for item in updated:
+                self.store.upsert("inventory", item)
+        self.store.commit()
+        if updated:
+            positions = {item.get("id"): i for i, item in enumerate(self.inventory)}
+            self.record_stock([
+                (item["id"], "sale", item["quantity"] - float(stock[item["id"]].get("quantity", 0)), order_id)
+                for item in updated
+            ])
+            for item in updated:
+                self.inventory[positions[item["id"]]] = item
+                self.bus.publish("inventory_changed", record=item)
+            self.data_versions["inventory"] += 1  # quantities only, so the compiled recipes stay valid
+            self.refresh_inventory()
+        self.order_index.add(order)
+        self.data_versions["orders"] += 1
+        self.rollups.apply_order(order, recipes)
+        self.store.write_file(ROLLUPS_FILE, self.rollups.snapshot)
+        self.store.commit()
+        self.bus.publish("order_placed", order=order)
         self.clear_order()
-        messagebox.showinfo("Success", f"Order #{order_id} placed successfully!")
+        if self.store.last_error is not None:
+            messagebox.showwarning("Not Saved Yet", f"Order #{order_id} was placed, but saving to disk is failing "
+                                   f"({self.store.last_error}). It will be written once that is fixed.")
+        else:
+            messagebox.showinfo("Success", f"Order #{order_id} placed successfully!")
+
+    def deduct_stock(self, needed):
+        """Updated copies of the inventory items after using `needed` (inventory id -> quantity), oldest lots first"""
+        stock = {item.get("id"): item for item in self.inventory}
+        updated = []
+        for inv_id, qty in needed.items():
+            item = dict(stock[inv_id])
+            item["lots"], _ = consume_fefo(item["lots"], qty)
+            sync_lots(item)
+            if item["quantity"] < float(item.get("threshold", 0)):
+                item["status"] = "Low Stock"
+            updated.append(item)
+        return updated
+
+    # --- ORDER HISTORY TAB ---
+    def setup_history_tab(self):
+        frame = self.frames["History"]
+        for widget in frame.winfo_children():
+            widget.destroy()
+        tb.Label(frame, text="Order History", font=("Segoe UI", 18, "bold"), 
+                bootstyle="primary").pack(pady=(20, 10))
+
+        # Filter bar
+        filters_frame = tb.Frame(frame, bootstyle="light")
+        filters_frame.pack(fill="x", padx=20, pady=10)
+        fields = [("Order ID", "order_id", 8), ("From", "start", 16), ("To", "end", 16),
+                  ("Item", "item", 14), ("Min ₹", "min_total", 8), ("Max ₹", "max_total", 8)]
+        self.history_filters = {}
+        for i, (label, key, width) in enumerate(fields):
+            tb.Label(filters_frame, text=label + ":", bootstyle="primary").grid(row=0, column=2 * i, padx=(5, 2))
+            entry = tb.Entry(filters_frame, width=width)
+            entry.grid(row=0, column=2 * i + 1, padx=(0, 5))
+            entry.bind("<Return>", lambda e: self.search_history())
+            self.history_filters[key] = entry
+        AnimatedButton(filters_frame, text="Search", bootstyle="success", command=self.search_history,
+                       cursor="hand2").grid(row=0, column=2 * len(fields), padx=5)
+        AnimatedButton(filters_frame, text="Clear", bootstyle="secondary", command=self.clear_history_filters,
+                       cursor="hand2").grid(row=0, column=2 * len(fields) + 1, padx=5)
+        self.history_status = tb.Label(
+            frame, bootstyle="secondary",
+            text="Times as YYYY-MM-DD or YYYY-MM-DD HH:MM; the item as a menu id or name. Double-click an order for its items."
+        )
+        self.history_status.pack(fill="x", padx=20)
+
+        columns = [("id", "ID"), ("datetime", "Date/Time"), ("items", "Items"), ("total", "Total"), ("status", "Status")]
+        self.history_source = OrderHistorySource(self._recent_order_row)
+        self.history_source.index = self.history_index
+        self.history_table = VirtualTable(frame, self.history_source, columns, height=15, width=140, striped=True,
+                                          search=False, bootstyle="light")
+        self.history_table.pack(fill="both", expand=True, padx=20, pady=10)
+        self.history_table.tree.bind("<Double-Button-1>", self.show_history_order)
+
+    def build_history_index(self):
+        """Index the archive and live orders on a worker, then run the current search"""
+        if self._history_job is not None:
+            return
+        self.history_status.configure(text="Indexing order history…")
+
+        def done(future):
+            if self._history_job is not future:
+                return  # the order history changed while indexing; a newer build is under way
+            self._history_job = None
+            try:
+                index = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to index order history: {e}")
+                return
+            # Orders placed while the index was being built
+            for order in self.order_index.orders:
+                if order["id"] not in index.by_id:
+                    index.add(order)
+            self.history_index = self.history_source.index = index
+            self.search_history()
+
+        self._history_job = self.submit_task(OrderHistoryIndex, done, self.archive, list(self.order_index.orders))
+
+    def history_item_id(self, text):
+        if not text:
+            return None
+        if text.isdigit():
+            return int(text)
+        item = self.menu_items.find(text)
+        if item is None:
+            raise ValueError(f"unknown menu item '{text}'")
+        return item["id"]
+
+    def search_history(self):
+        values = {key: entry.get().strip() for key, entry in self.history_filters.items()}
+        try:
+            filters = {
+                "order_id": int(values["order_id"]) if values["order_id"] else None,
+                "start": parse_history_time(values["start"]),
+                "end": parse_history_time(values["end"], end=True),
+                "item_id": self.history_item_id(values["item"]),
+                "min_total": float(values["min_total"]) if values["min_total"] else None,
+                "max_total": float(values["max_total"]) if values["max_total"] else None,
+            }
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid filter: {e}")
+            return
+        self.history_source.filters = filters
+        if self.history_index is None or self.history_index.stale:
+            self.build_history_index()
+            return
+        started = time.perf_counter()
+        self.history_table.offset = 0
+        self.history_table.refresh()
+        elapsed = (time.perf_counter() - started) * 1000
+        self.history_status.configure(text=f"{self.history_table.count} of {len(self.history_index)} orders "
+                                           f"({elapsed:.1f} ms)")
+
+    def clear_history_filters(self):
+        for entry in self.history_filters.values():
+            entry.delete(0, "end")
+        self.search_history()
+
+    def show_history_order(self, event):
+        selected = self.history_table.tree.selection()
+        if not selected or self.history_index is None:
+            return
+        order = self.history_index.order(self.history_index.by_id[int(selected[0])])
+        lines = [f"{item['name']} x{item['quantity']} = ₹{item['total']:.2f}" for item in order["items"]]
+        messagebox.showinfo(f"Order #{order['id']}", f"{order['datetime']} ({order['status']})\n\n"
+                            + "\n".join(lines) + f"\n\nTotal: ₹{order['total']:.2f}")
+
+    def _history_order_placed(self, order):
+        if self.history_index is None:
+            return
+        self.history_index.add(order)
+        if self.current_section == "History":
+            if self.history_index.stale:
+                self.build_history_index()
+            else:
+                self.history_table.refresh()
+
+    def _history_reloaded(self):
+        self.history_index = self.history_source.index = None
+        if self._history_job is not None:
+            self._history_job.cancel()
+            self._history_job = None
+        if self.current_section == "History":
+            self.build_history_index()
 
     # --- REPORTS TAB ---
     def setup_reports_tab(self):
@@ -862,126 +4250,222 @@ class CanteenManagementSystem:
             widget.destroy()
 
         # Refresh button
-        refresh_btn = AnimatedButton(frame, text="🔄 Refresh", bootstyle="info", command=self.setup_reports_tab, cursor="hand2")
+        refresh_btn = AnimatedButton(frame, text="🔄 Refresh", bootstyle="info", command=self.refresh_reports, cursor="hand2")
         refresh_btn.place(relx=0.98, rely=0.02, anchor="ne")
 
-        # Tabbed notebook for reports
-        notebook = tb.Notebook(frame, bootstyle="primary")
-        notebook.pack(fill="both", expand=True, padx=20, pady=20)
-
-        # --- Sales Report Tab ---
-        sales_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(sales_tab, text="Sales Report")
-        self._build_sales_report(sales_tab)
-
-        # --- Top-Selling Items Tab ---
-        top_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(top_tab, text="Top-Selling Items")
-        self._build_top_selling_report(top_tab)
-
-        # --- Inventory Usage Tab ---
-        usage_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(usage_tab, text="Inventory Usage")
-        self._build_inventory_usage_report(usage_tab)
-
-        # --- Low Stock Tab ---
-        low_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(low_tab, text="Low Stock")
-        self._build_low_stock_report(low_tab)
-
-        # --- Wastage & Expiry Tab ---
-        wastage_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(wastage_tab, text="Wastage & Expiry")
-        self._build_wastage_expiry_report(wastage_tab)
-
-        # --- Profit/Loss Tab ---
-        profit_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(profit_tab, text="Profit/Loss")
-        self._build_profit_loss_report(profit_tab)
-
-        # --- Peak Hour Tab ---
-        peak_tab = tb.Frame(notebook, bootstyle="light")
-        notebook.add(peak_tab, text="Peak Hour")
-        self._build_peak_hour_report(peak_tab)
+        # Tabbed notebook for reports; each tab is built the first time it is shown
+        self.report_notebook = tb.Notebook(frame, bootstyle="primary")
+        self.report_notebook.pack(fill="both", expand=True, padx=20, pady=20)
+        self.report_tabs = {}
+        self._report_cache = {}
+        self.figure_pool = FigurePool()
+
+        # (title, builder, filtered by the order date range, datasets it reads)
+        reports = [
+            ("Sales Report", self._build_sales_report, True, ("orders",)),
+            ("Top-Selling Items", self._build_top_selling_report, True, ("orders",)),
+            ("Inventory Usage", self._build_inventory_usage_report, True, ("orders", "inventory")),
+            ("Low Stock", self._build_low_stock_report, False, ("inventory",)),
+            ("Wastage & Expiry", self._build_wastage_expiry_report, False, ("inventory",)),
+            ("Profit/Loss", self._build_profit_loss_report, True, ("orders", "inventory")),
+            ("Peak Hour", self._build_peak_hour_report, True, ("orders",)),
+        ]
+        for title, builder, ranged, datasets in reports:
+            tab = tb.Frame(self.report_notebook, bootstyle="light")
+            self.report_notebook.add(tab, text=title)
+            self.report_tabs[str(tab)] = {"tab": tab, "builder": builder, "ranged": ranged, "datasets": datasets,
+                                          "range": (None, None), "built": False, "body": None,
+                                          "update": None, "drawn": None, "loading": None,
+                                          "job": None, "job_key": None}
+        self.report_notebook.bind("<<NotebookTabChanged>>", lambda e: self.refresh_reports())
+
+    def refresh_reports(self):
+        """Draw the selected report tab if it has never been drawn or its data changed since"""
+        if self.current_section != "Reports":
+            return
+        state = self.report_tabs.get(self.report_notebook.select())
+        if state is not None:
+            self._render_report_tab(state)
+
+    def _render_report_tab(self, state):
+        if not state["built"]:
+            if state["ranged"]:
+                def on_range(start_day, end_day):
+                    state["range"] = (start_day, end_day)
+                    self._render_report_tab(state)
+                self._build_range_bar(state["tab"], on_range)
+            state["built"] = True
+        if state["update"] is None:
+            state["body"] = tb.Frame(state["tab"], bootstyle="light")
+            state["body"].pack(fill="both", expand=True)
+            state["update"] = state["builder"](state["body"])
+            state["drawn"] = None
+        self.figure_pool.touch(str(state["tab"]))
+        key = (state["range"], tuple(self.data_versions[name] for name in state["datasets"]))
+        if state["drawn"] == key:
+            return  # the canvas on screen is still current
+        data_key = (*state["range"], self.data_versions["orders"], self.data_versions["inventory"])
+        data = self._report_cache.get(data_key)
+        if data is not None:
+            self._draw_report_tab(state, key, data)
+            return
+        self._show_report_loading(state)
+        if state["job"] is not None:
+            if state["job_key"] == key:
+                return  # already computing this exact view
+            state["job"].cancel()  # superseded; a result that still arrives is discarded
+        inventory = [dict(item) for item in self.inventory]
+        state["job_key"] = key
+        state["job"] = self.submit_task(self.compute_reports,
+                                        lambda future: self._report_ready(state, key, data_key, future),
+                                        *state["range"], inventory, self.compiled_recipes())
+
+    def _report_ready(self, state, key, data_key, future):
+        try:
+            data = future.result()
+        except Exception as e:
+            if state["job"] is future:
+                state["job"] = None
+                self._hide_report_loading(state)
+                messagebox.showerror("Error", f"Failed to compute report: {e}")
+            return
+        if len(self._report_cache) >= 8:
+            self._report_cache.clear()
+        self._report_cache[data_key] = data
+        if state["job"] is not future:
+            return  # the user asked for another range or refreshed since
+        state["job"] = None
+        if state["update"] is not None:
+            self._draw_report_tab(state, key, data)
+
+    def _draw_report_tab(self, state, key, data):
+        self._hide_report_loading(state)
+        state["update"](data)
+        state["drawn"] = key
+
+    def _show_report_loading(self, state):
+        """Overlay a progress indicator on the tab's (still empty or stale) widgets"""
+        if state["loading"] is not None:
+            return
+        overlay = tb.Frame(state["body"], bootstyle="light")
+        tb.Label(overlay, text="Loading report…", font=("Segoe UI", 12), bootstyle="secondary").pack(pady=(10, 5))
+        progress = tb.Progressbar(overlay, mode="indeterminate", length=220, bootstyle="info-striped")
+        progress.pack(padx=20, pady=(0, 10))
+        progress.start(15)
+        overlay.place(relx=0.5, rely=0.4, anchor="center")
+        state["loading"] = overlay
+
+    def _hide_report_loading(self, state):
+        if state["loading"] is not None:
+            state["loading"].destroy()
+            state["loading"] = None
+
+    def _release_report_tab(self, state):
+        """Called when the figure pool evicts this tab's chart; it is rebuilt on next show"""
+        if state["body"] is not None:
+            state["body"].destroy()
+        state["body"] = state["update"] = state["drawn"] = state["loading"] = None
+
+    def _report_chart(self, body, figsize, title, xlabel="", ylabel=""):
+        """Pooled chart for the report tab that owns `body`, with zoom buttons under it"""
+        state = self.report_tabs[str(body.master)]
+        chart = self.figure_pool.chart(str(body.master), body, figsize, title, xlabel, ylabel,
+                                       on_release=lambda: self._release_report_tab(state))
+        zoom_frame = tb.Frame(body, bootstyle="light")
+        zoom_frame.pack(anchor="ne", padx=10)
+        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(chart, 1.2)).pack(side="left", padx=2)
+        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(chart, 0.8)).pack(side="left", padx=2)
+        return chart
+
+    def compute_reports(self, start_day=None, end_day=None, inventory=None, recipes=None):
+        """Report aggregates for a range; safe on a worker given an inventory snapshot and compiled recipes"""
+        if inventory is None:
+            inventory = self.inventory
+        if recipes is None:
+            recipes = self.compiled_recipes()
+        data = ReportAggregates.from_rollups(self.rollups, inventory, recipes, start_day, end_day)
+        # Usage and stock on hand come from the stock ledger rather than from recipes x units sold
+        start = None if start_day is None else day_start_epoch(start_day)
+        end = None if end_day is None else day_start_epoch(end_day) + 86400
+        data.used = {}
+        for item in inventory:
+            used = round(self.stock_ledger.usage_between(item["id"], start, end), 6)
+            if used:
+                data.used[item["name"]] = data.used.get(item["name"], 0) + used
+            if end is not None:
+                data.stock[item["name"]] = round(self.stock_ledger.balance_at(item["id"], end), 6)
+        data.add_expired(self.expiry_index.expired())
+        return data
+
+    def _build_range_bar(self, parent, on_change):
+        bar = tb.Frame(parent, bootstyle="light")
+        bar.pack(fill="x", padx=20, pady=(10, 0))
+        tb.Label(bar, text="Range:", bootstyle="primary").pack(side="left")
+        preset = tk.StringVar(value="All time")
+        preset_combo = tb.Combobox(bar, textvariable=preset, values=list(RANGE_PRESETS) + ["Custom"],
+                                   state="readonly", width=14, bootstyle="primary")
+        preset_combo.pack(side="left", padx=5)
+        start_entry = tb.DateEntry(bar, dateformat="%Y-%m-%d", bootstyle="primary", width=11)
+        start_entry.pack(side="left", padx=5)
+        tb.Label(bar, text="to", bootstyle="primary").pack(side="left")
+        end_entry = tb.DateEntry(bar, dateformat="%Y-%m-%d", bootstyle="primary", width=11)
+        end_entry.pack(side="left", padx=5)
+
+        def apply(event=None):
+            name = preset.get()
+            if name != "Custom":
+                on_change(*range_for_preset(name))
+                return
+            start_day, end_day = start_entry.entry.get().strip(), end_entry.entry.get().strip()
+            try:
+                day_start_epoch(start_day)
+                day_start_epoch(end_day)
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format")
+                return
+            on_change(start_day, end_day)
+
+        preset_combo.bind("<<ComboboxSelected>>", apply)
+        tb.Button(bar, text="Apply", bootstyle="info", command=apply, cursor="hand2").pack(side="left", padx=5)
 
     # --- Helper methods for each report tab ---
+    # Each builder creates its widgets once and returns update(data), which
+    # refreshes them in place.
     def _build_sales_report(self, tab):
         tb.Label(tab, text="Sales Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        sales_by_day = {}
-        for order in self.orders:
-            dt = order.get("datetime", "")[:10]
-            sales_by_day.setdefault(dt, 0)
-            sales_by_day[dt] += order.get("total", 0)
-        days = sorted(sales_by_day.keys())
-        sales = [sales_by_day[d] for d in days]
-        fig, ax = plt.subplots(figsize=(5, 2.5))
-        ax.bar(days, sales, color="#4caf50")
-        ax.set_title("Daily Sales")
-        ax.set_ylabel("Revenue (₹)")
-        ax.set_xlabel("Date")
-        fig.tight_layout()
-        sales_canvas = FigureCanvasTkAgg(fig, master=tab)
-        sales_canvas.draw()
-        sales_canvas.get_tk_widget().pack(fill="both", expand=True)
-        # Zoom buttons
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig, sales_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig, sales_canvas, 0.8)).pack(side="left", padx=2)
+        chart = self._report_chart(tab, (5, 2.5), "Daily Sales", xlabel="Date", ylabel="Revenue (₹)")
         # Sales summary
-        total_sales = sum(sales)
-        tb.Label(tab, text=f"Total Sales: ₹{total_sales:.2f}", font=("Segoe UI", 12), bootstyle="success").pack(anchor="w", padx=20, pady=10)
+        total_label = tb.Label(tab, font=("Segoe UI", 12), bootstyle="success")
+        total_label.pack(anchor="w", padx=20, pady=10)
+
+        def update(data):
+            period, periods, sales = sales_series(data.sales_by_day)
+            chart.title = f"{period} Sales"
+            chart.bar(periods, sales, color="#4caf50")
+            total_label.configure(text=f"Total Sales: ₹{sum(sales):.2f}")
+        return update
 
     def _build_top_selling_report(self, tab):
         tb.Label(tab, text="Top-Selling Items", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        item_sales = {}
-        for order in self.orders:
-            for item in order.get("items", []):
-                name = item["name"]
-                item_sales.setdefault(name, 0)
-                item_sales[name] += item["quantity"]
-        top_names = list(item_sales.keys())
-        top_quantities = [item_sales[n] for n in top_names]
-        fig2, ax2 = plt.subplots(figsize=(4, 2.5))
-        ax2.pie(top_quantities, labels=top_names, autopct='%1.1f%%', startangle=140)
-        ax2.set_title("Top-Selling Items")
-        fig2.tight_layout()
-        pie_canvas = FigureCanvasTkAgg(fig2, master=tab)
-        pie_canvas.draw()
-        pie_canvas.get_tk_widget().pack(fill="both", expand=True)
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig2, pie_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig2, pie_canvas, 0.8)).pack(side="left", padx=2)
+        chart = self._report_chart(tab, (4, 2.5), "Top-Selling Items")
+
+        def update(data):
+            top_names = list(data.item_sales.keys())
+            chart.pie(top_names, [data.item_sales[n] for n in top_names])
+        return update
 
     def _build_inventory_usage_report(self, tab):
         tb.Label(tab, text="Inventory Usage Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        used = {}
-        for order in self.orders:
-            for item in order.get("items", []):
-                recipe = RECIPE_MAP.get(item["id"], {})
-                for inv_name, qty_per in recipe.items():
-                    used.setdefault(inv_name, 0)
-                    used[inv_name] += qty_per * item["quantity"]
-        available = {item["name"]: item["quantity"] for item in self.inventory}
-        inv_names = list(available.keys())
-        used_qty = [used.get(n, 0) for n in inv_names]
-        avail_qty = [available[n] for n in inv_names]
-        fig3, ax3 = plt.subplots(figsize=(5, 2.5))
-        ax3.plot(inv_names, avail_qty, label="Available", marker='o')
-        ax3.plot(inv_names, used_qty, label="Used", marker='o')
-        ax3.set_title("Inventory Usage")
-        ax3.set_ylabel("Quantity")
-        ax3.set_xlabel("Item")
-        ax3.legend()
-        fig3.tight_layout()
-        usage_canvas = FigureCanvasTkAgg(fig3, master=tab)
-        usage_canvas.draw()
-        usage_canvas.get_tk_widget().pack(fill="both", expand=True)
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig3, usage_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig3, usage_canvas, 0.8)).pack(side="left", padx=2)
+        chart = self._report_chart(tab, (5, 2.5), "Inventory Usage", xlabel="Item", ylabel="Quantity")
+
+        def update(data):
+            available = data.stock
+            inv_names = list(available.keys())
+            chart.lines(inv_names, [
+                ([available[n] for n in inv_names], {"label": "Available", "marker": "o"}),
+                ([data.used.get(n, 0) for n in inv_names], {"label": "Used", "marker": "o"}),
+            ])
+        return update
 
     def _build_low_stock_report(self, tab):
         tb.Label(tab, text="Low Stock Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
@@ -994,117 +4478,67 @@ class CanteenManagementSystem:
         scroll = tb.Scrollbar(tab, orient="vertical", command=tree.yview, bootstyle="danger-round")
         tree.configure(yscrollcommand=scroll.set)
         scroll.pack(side="right", fill="y")
-        for item in self.inventory:
-            if float(item.get("quantity", 0)) < float(item.get("threshold", 0)):
+        tree.tag_configure("low", foreground="red")
+
+        def update(data):
+            tree.delete(*tree.get_children())
+            for item in data.low_stock:
                 tree.insert("", "end", values=(
                     item.get("id", ""), item.get("name", ""), item.get("category", ""),
                     item.get("quantity", ""), item.get("threshold", "")
                 ), tags=("low",))
-        tree.tag_configure("low", foreground="red")
+        return update
 
     def _build_wastage_expiry_report(self, tab):
         tb.Label(tab, text="Wastage & Expiry Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        expired_items = []
-        today = datetime.now().date()
-        for item in self.inventory:
-            try:
-                expiry = datetime.strptime(item.get("expiry_date", ""), "%Y-%m-%d").date()
-                if expiry < today:
-                    expired_items.append(item)
-            except Exception:
-                continue
-        expiry_trend = {}
-        for item in expired_items:
-            try:
-                expiry = datetime.strptime(item.get("expiry_date", ""), "%Y-%m-%d").date()
-                key = expiry.strftime("%Y-%m")
-                expiry_trend.setdefault(key, 0)
-                expiry_trend[key] += 1
-            except Exception:
-                continue
-        months = sorted(expiry_trend.keys())
-        counts = [expiry_trend[m] for m in months]
-        fig4, ax4 = plt.subplots(figsize=(4, 2.5))
-        ax4.plot(months, counts, marker='o', color="red")
-        ax4.set_title("Wastage Trend (Expired Items)")
-        ax4.set_ylabel("Count")
-        ax4.set_xlabel("Month")
-        fig4.tight_layout()
-        wastage_canvas = FigureCanvasTkAgg(fig4, master=tab)
-        wastage_canvas.draw()
-        wastage_canvas.get_tk_widget().pack(fill="both", expand=True)
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig4, wastage_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig4, wastage_canvas, 0.8)).pack(side="left", padx=2)
-        # Table of expired items
+        chart = self._report_chart(tab, (4, 2.5), "Wastage Trend (Expired Items)", xlabel="Month", ylabel="Count")
+        # Table of expired lots
         tb.Label(tab, text="Expired Items", font=("Segoe UI", 12, "bold"), bootstyle="danger").pack(pady=(20, 5))
-        expired_tree = tb.Treeview(tab, columns=("ID", "Name", "Expiry Date"), show="headings", height=8, bootstyle="danger")
-        for col in ("ID", "Name", "Expiry Date"):
+        columns = ("ID", "Name", "Lot", "Quantity", "Expiry Date")
+        expired_tree = tb.Treeview(tab, columns=columns, show="headings", height=8, bootstyle="danger")
+        for col in columns:
             expired_tree.heading(col, text=col)
             expired_tree.column(col, width=100, anchor="center")
         expired_tree.pack(fill="both", expand=True, padx=20, pady=10)
         expired_scroll = tb.Scrollbar(tab, orient="vertical", command=expired_tree.yview, bootstyle="danger-round")
         expired_tree.configure(yscrollcommand=expired_scroll.set)
         expired_scroll.pack(side="right", fill="y")
-        for item in expired_items:
-            expired_tree.insert("", "end", values=(item.get("id", ""), item.get("name", ""), item.get("expiry_date", "")), tags=("expired",))
         expired_tree.tag_configure("expired", foreground="red")
 
+        def update(data):
+            months = sorted(data.expiry_trend.keys())
+            chart.lines(months, [([data.expiry_trend[m] for m in months], {"marker": "o", "color": "red"})])
+            expired_tree.delete(*expired_tree.get_children())
+            for lot in data.expired_items:
+                expired_tree.insert("", "end", values=(lot["id"], lot["name"], lot["lot"], f"{lot['quantity']:g}", lot["expiry_date"]), tags=("expired",))
+        return update
+
     def _build_profit_loss_report(self, tab):
         tb.Label(tab, text="Profit/Loss Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        total_revenue = sum(order.get("total", 0) for order in self.orders)
-        total_cost = 0
-        for order in self.orders:
-            for item in order.get("items", []):
-                recipe = RECIPE_MAP.get(item["id"], {})
-                for inv_name, qty_per in recipe.items():
-                    inv_item = next((x for x in self.inventory if x["name"] == inv_name), None)
-                    if inv_item:
-                        total_cost += qty_per * item["quantity"] * inv_item.get("supplier_price", 0)
-        net_profit = total_revenue - total_cost
-        fig5, ax5 = plt.subplots(figsize=(4, 2.5))
-        ax5.bar(["Revenue", "Cost", "Profit"], [total_revenue, total_cost, net_profit], color=["#4caf50", "#f44336", "#2196f3"])
-        ax5.set_title("Profit/Loss")
-        ax5.set_ylabel("Amount (₹)")
-        fig5.tight_layout()
-        profit_canvas = FigureCanvasTkAgg(fig5, master=tab)
-        profit_canvas.draw()
-        profit_canvas.get_tk_widget().pack(fill="both", expand=True)
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig5, profit_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig5, profit_canvas, 0.8)).pack(side="left", padx=2)
-        tb.Label(tab, text=f"Total Revenue: ₹{total_revenue:.2f}", font=("Segoe UI", 12), bootstyle="success").pack(anchor="w", padx=20, pady=5)
-        tb.Label(tab, text=f"Total Cost: ₹{total_cost:.2f}", font=("Segoe UI", 12), bootstyle="danger").pack(anchor="w", padx=20, pady=5)
-        tb.Label(tab, text=f"Net Profit: ₹{net_profit:.2f}", font=("Segoe UI", 12), bootstyle="info").pack(anchor="w", padx=20, pady=5)
+        chart = self._report_chart(tab, (4, 2.5), "Profit/Loss", ylabel="Amount (₹)")
+        revenue_label = tb.Label(tab, font=("Segoe UI", 12), bootstyle="success")
+        revenue_label.pack(anchor="w", padx=20, pady=5)
+        cost_label = tb.Label(tab, font=("Segoe UI", 12), bootstyle="danger")
+        cost_label.pack(anchor="w", padx=20, pady=5)
+        profit_label = tb.Label(tab, font=("Segoe UI", 12), bootstyle="info")
+        profit_label.pack(anchor="w", padx=20, pady=5)
+
+        def update(data):
+            chart.bar(["Revenue", "Cost", "Profit"], [data.total_revenue, data.total_cost, data.net_profit],
+                      color=["#4caf50", "#f44336", "#2196f3"])
+            revenue_label.configure(text=f"Total Revenue: ₹{data.total_revenue:.2f}")
+            cost_label.configure(text=f"Total Cost: ₹{data.total_cost:.2f}")
+            profit_label.configure(text=f"Net Profit: ₹{data.net_profit:.2f}")
+        return update
 
     def _build_peak_hour_report(self, tab):
         tb.Label(tab, text="Peak Hour Report", font=("Segoe UI", 16, "bold"), bootstyle="primary").pack(pady=(20, 10))
-        hour_counts = {}
-        for order in self.orders:
-            try:
-                dt = datetime.strptime(order.get("datetime", ""), "%Y-%m-%d %H:%M:%S")
-                hour = dt.strftime("%H")
-                hour_counts.setdefault(hour, 0)
-                hour_counts[hour] += 1
-            except Exception:
-                continue
-        hours = sorted(hour_counts.keys())
-        counts = [hour_counts[h] for h in hours]
-        fig6, ax6 = plt.subplots(figsize=(5, 2.5))
-        ax6.plot(hours, counts, marker='o', color="#ff9800")
-        ax6.set_title("Peak Hours (Orders per Hour)")
-        ax6.set_ylabel("Orders")
-        ax6.set_xlabel("Hour")
-        fig6.tight_layout()
-        peak_canvas = FigureCanvasTkAgg(fig6, master=tab)
-        peak_canvas.draw()
-        peak_canvas.get_tk_widget().pack(fill="both", expand=True)
-        zoom_frame = tb.Frame(tab, bootstyle="light")
-        zoom_frame.pack(anchor="ne", padx=10)
-        tb.Button(zoom_frame, text="➕", bootstyle="success", command=lambda: self.zoom_figure(fig6, peak_canvas, 1.2)).pack(side="left", padx=2)
-        tb.Button(zoom_frame, text="➖", bootstyle="danger", command=lambda: self.zoom_figure(fig6, peak_canvas, 0.8)).pack(side="left", padx=2)
+        chart = self._report_chart(tab, (5, 2.5), "Peak Hours (Orders per Hour)", xlabel="Hour", ylabel="Orders")
+
+        def update(data):
+            hours = sorted(data.hour_counts.keys())
+            chart.lines(hours, [([data.hour_counts[h] for h in hours], {"marker": "o", "color": "#ff9800"})])
+        return update
 
     def download_reports(self):
         filename = filedialog.asksaveasfilename(
@@ -1115,128 +4549,38 @@ class CanteenManagementSystem:
         )
         if not filename:
             return  # User cancelled
-        doc = SimpleDocTemplate(filename, pagesize=A4)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # --- Sales Report ---
-        elements.append(Paragraph("Sales Report", styles['Heading2']))
-        sales_by_day = {}
-        for order in self.orders:
-            dt = order.get("datetime", "")[:10]
-            sales_by_day.setdefault(dt, 0)
-            sales_by_day[dt] += order.get("total", 0)
-        days = sorted(sales_by_day.keys())
-        sales = [sales_by_day[d] for d in days]
-        sales_table = [["Date", "Sales (₹)"]]
-        for d in days:
-            sales_table.append([d, f"{sales_by_day[d]:.2f}"])
-        elements.append(Table(sales_table, hAlign='LEFT'))
-        elements.append(Spacer(1, 12))
-        elements.append(Paragraph(f"Total Sales: ₹{sum(sales):.2f}", styles['Normal']))
-        elements.append(PageBreak())
-
-        # --- Top-Selling Items ---
-        elements.append(Paragraph("Top-Selling Items", styles['Heading2']))
-        item_sales = {}
-        for order in self.orders:
-            for item in order.get("items", []):
-                name = item["name"]
-                item_sales.setdefault(name, 0)
-                item_sales[name] += item["quantity"]
-        top_table = [["Item", "Quantity Sold"]]
-        for name, qty in item_sales.items():
-            top_table.append([name, qty])
-        elements.append(Table(top_table, hAlign='LEFT'))
-        elements.append(PageBreak())
-
-        # --- Inventory Usage ---
-        elements.append(Paragraph("Inventory Usage Report", styles['Heading2']))
-        used = {}
-        for order in self.orders:
-            for item in order.get("items", []):
-                recipe = RECIPE_MAP.get(item["id"], {})
-                for inv_name, qty_per in recipe.items():
-                    used.setdefault(inv_name, 0)
-                    used[inv_name] += qty_per * item["quantity"]
-        available = {item["name"]: item["quantity"] for item in self.inventory}
-        usage_table = [["Item", "Available", "Used"]]
-        for name in available:
-            usage_table.append([name, available[name], used.get(name, 0)])
-        elements.append(Table(usage_table, hAlign='LEFT'))
-        elements.append(PageBreak())
-
-        # --- Low Stock Report ---
-        elements.append(Paragraph("Low Stock Report", styles['Heading2']))
-        low_table = [["ID", "Name", "Category", "Quantity", "Threshold"]]
-        for item in self.inventory:
-            if float(item.get("quantity", 0)) < float(item.get("threshold", 0)):
-                low_table.append([
-                    item.get("id", ""), item.get("name", ""), item.get("category", ""),
-                    item.get("quantity", ""), item.get("threshold", "")
-                ])
-        elements.append(Table(low_table, hAlign='LEFT'))
-        elements.append(PageBreak())
-
-        # --- Wastage & Expiry Report ---
-        elements.append(Paragraph("Wastage & Expiry Report", styles['Heading2']))
-        expired_items = []
-        today = datetime.now().date()
-        for item in self.inventory:
-            try:
-                expiry = datetime.strptime(item.get("expiry_date", ""), "%Y-%m-%d").date()
-                if expiry < today:
-                    expired_items.append(item)
-            except Exception:
-                continue
-        expired_table = [["ID", "Name", "Expiry Date"]]
-        for item in expired_items:
-            expired_table.append([item.get("id", ""), item.get("name", ""), item.get("expiry_date", "")])
-        elements.append(Table(expired_table, hAlign='LEFT'))
-        elements.append(PageBreak())
-
-        # --- Profit/Loss Report ---
-        elements.append(Paragraph("Profit/Loss Report", styles['Heading2']))
-        total_revenue = sum(order.get("total", 0) for order in self.orders)
-        total_cost = 0
-        for order in self.orders:
-            for item in order.get("items", []):
-                recipe = RECIPE_MAP.get(item["id"], {})
-                for inv_name, qty_per in recipe.items():
-                    inv_item = next((x for x in self.inventory if x["name"] == inv_name), None)
-                    if inv_item:
-                        total_cost += qty_per * item["quantity"] * inv_item.get("supplier_price", 0)
-        net_profit = total_revenue - total_cost
-        profit_table = [
-            ["Total Revenue (₹)", f"{total_revenue:.2f}"],
-            ["Total Cost (₹)", f"{total_cost:.2f}"],
-            ["Net Profit (₹)", f"{net_profit:.2f}"]
-        ]
-        elements.append(Table(profit_table, hAlign='LEFT'))
-        elements.append(PageBreak())
+        if self._export_job is not None:
+            messagebox.showinfo("Report Export", "A report is already being generated.")
+            return
+        if self.export_pool is None:
+            # spawn, not fork: the parent has Tk and store threads running
+            self.export_pool = ProcessPoolExecutor(max_workers=EXPORT_PROCESSES,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+        progress_win = tb.Toplevel(self.root)
+        progress_win.title("Generating Report")
+        progress_win.transient(self.root)
+        progress_win.resizable(False, False)
+        tb.Label(progress_win, text="Generating report…", font=("Segoe UI", 12), bootstyle="primary").pack(padx=30, pady=(20, 10))
+        progress = tb.Progressbar(progress_win, mode="indeterminate", length=260, bootstyle="info-striped")
+        progress.pack(padx=30, pady=(0, 20))
+        progress.start(15)
 
-        # --- Peak Hour Report ---
-        elements.append(Paragraph("Peak Hour Report", styles['Heading2']))
-        hour_counts = {}
-        for order in self.orders:
+        def done(future):
+            self._export_job = None
+            progress_win.destroy()
             try:
-                dt = datetime.strptime(order.get("datetime", ""), "%Y-%m-%d %H:%M:%S")
-                hour = dt.strftime("%H")
-                hour_counts.setdefault(hour, 0)
-                hour_counts[hour] += 1
-            except Exception:
-                continue
-        peak_table = [["Hour", "Orders"]]
-        for hour in sorted(hour_counts.keys()):
-            peak_table.append([hour, hour_counts[hour]])
-        elements.append(Table(peak_table, hAlign='LEFT'))
+                future.result()
+                messagebox.showinfo("Report Downloaded", f"Report saved as {filename}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to generate report: {e}")
 
-        # Build PDF
-        try:
-            doc.build(elements)
-            messagebox.showinfo("Report Downloaded", f"Report saved as {filename}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate report: {e}")
+        self._export_job = self.submit_task(self.write_report_pdf, done, filename,
+                                            [dict(item) for item in self.inventory], self.compiled_recipes())
+
+    def write_report_pdf(self, filename, inventory, recipes):
+        """Compute the report and hand it to the export processes; runs on a worker thread"""
+        data = self.compute_reports(inventory=inventory, recipes=recipes)
+        return export_report_pdf(self.export_pool, filename, data, inventory)
 
     # --- Settings Tab ---
     def setup_settings_tab(self):
@@ -1245,8 +4589,205 @@ class CanteenManagementSystem:
             widget.destroy()
         tb.Label(frame, text="Settings", font=("Segoe UI", 18, "bold"), bootstyle="primary").pack(pady=20)
         # Add settings options here
+        AnimatedButton(frame, text="Verify Report Rollups", bootstyle="secondary",
+                       command=self.verify_rollups, cursor="hand2").pack(pady=5)
+        AnimatedButton(frame, text="Import / Export Data", bootstyle="info",
+                       command=self.open_data_exchange, cursor="hand2").pack(pady=5)
+
+    # --- Data exchange ---
+    def open_data_exchange(self):
+        window = tb.Toplevel(self.root)
+        window.title("Import / Export Data")
+        window.transient(self.root)
+        window.resizable(False, False)
+        form = tb.Frame(window, padding=20)
+        form.pack(fill="both", expand=True)
+        tb.Label(form, text="Dataset:", bootstyle="primary").grid(row=0, column=0, sticky="w", pady=5)
+        dataset = tk.StringVar(value="orders")
+        tb.Combobox(form, textvariable=dataset, values=list(EXCHANGE_FIELDS), state="readonly",
+                    width=14, bootstyle="primary").grid(row=0, column=1, sticky="ew", padx=5, pady=5)
+        tb.Label(form, text="CSV or JSON Lines; add .gz to compress", bootstyle="secondary").grid(
+            row=1, column=0, columnspan=2, sticky="w", pady=(0, 10))
+        status = tb.Label(form, text="", bootstyle="info")
+        status.grid(row=3, column=0, columnspan=2, sticky="w", pady=(10, 0))
+        buttons = []
+
+        def busy(running, text=""):
+            status.configure(text=text)
+            for button in buttons:
+                button.configure(state="disabled" if running else "normal")
+
+        def done(title, message, error=False):
+            busy(False)
+            if window.winfo_exists():
+                (messagebox.showerror if error else messagebox.showinfo)(title, message, parent=window)
+
+        actions = [
+            ("⬇️ Export", lambda: self.export_data(dataset.get(), busy, done), "success"),
+            ("⬆️ Import", lambda: self.import_data(dataset.get(), busy, done), "warning"),
+        ]
+        for i, (text, command, style) in enumerate(actions):
+            button = AnimatedButton(form, text=text, command=command, bootstyle=style, cursor="hand2")
+            button.grid(row=2, column=i, padx=5, pady=5, sticky="ew")
+            buttons.append(button)
+
+    def export_data(self, dataset, busy, done):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=EXCHANGE_FILETYPES,
+            initialfile=f"canteen_{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            title=f"Export {dataset.title()}"
+        )
+        if not path:
+            return
+        try:
+            exchange_format(path)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        # Workers only see snapshots; archived orders are streamed straight from the partitions
+        if dataset == "orders":
+            records = iter_order_lines(list(self.orders), self.archive)
+        elif dataset == "menu":
+            records = [dict(item) for item in self.menu_items]
+        else:
+            records = [dict(item) for item in self.inventory]
+
+        def finished(future):
+            try:
+                count = future.result()
+            except Exception as e:
+                done("Error", f"Failed to export {dataset}: {e}", error=True)
+                return
+            done("Export Complete", f"Exported {count} {dataset} records to {path}")
+
+        busy(True, f"Exporting {dataset}…")
+        self.submit_task(write_records, finished, path, EXCHANGE_FIELDS[dataset], records)
+
+    def import_data(self, dataset, busy, done):
+        """Validate and insert records in batches, one batch per Tk event-loop turn"""
+        path = filedialog.askopenfilename(filetypes=EXCHANGE_FILETYPES + [("All files", "*.*")],
+                                          title=f"Import {dataset.title()}")
+        if not path:
+            return
+        try:
+            exchange_format(path)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        rejected = {"count": 0, "errors": []}
+        stats = {"imported": 0, "skipped": 0}
+        closed = {}  # month -> imported orders for the archive, sealed once at the end
+        if dataset == "orders":
+            known_ids = {order.get("id") for order in self.orders}
+            for month in self.archive.months():
+                known_ids.update(self.archive.columns(month)[0]["order_id"])
+            batches = parsed_batches(group_order_lines(read_records(path)), parse_order, rejected)
+            apply = lambda batch: self._import_order_batch(batch, known_ids, stats, closed)
+        else:
+            parse = parse_menu_item if dataset == "menu" else parse_inventory_item
+            batches = parsed_batches(read_records(path), parse, rejected)
+            apply = lambda batch: self._import_catalog_batch(dataset, batch, stats)
+
+        def step():
+            try:
+                batch = next(batches, None)
+                if batch is not None:
+                    apply(batch)
+            except (OSError, EOFError, csv.Error, UnicodeDecodeError) as e:
+                batch = None
+                rejected["errors"].insert(0, f"stopped reading the file: {e}")
+            if batch is not None:
+                busy(True, f"Imported {stats['imported']} {dataset} records…")
+                self.root.after(1, step)
+                return
+            if closed:
+                busy(True, f"Archiving {sum(map(len, closed.values()))} orders…")
+                self.submit_task(self.seal_months, finish, closed)
+            else:
+                finish(None)
+
+        def finish(sealed):
+            if sealed is not None:
+                try:
+                    sealed.result()
+                except Exception as e:
+                    rejected["errors"].insert(0, f"failed to archive the imported orders: {e}")
+                    stats["imported"] -= sum(map(len, closed.values()))
+                self.data_versions["orders"] += 1
+            self._refresh_after_import(dataset)
+            message = f"Imported {stats['imported']} {dataset} records."
+            if stats["skipped"]:
+                message += f"\nSkipped {stats['skipped']} already present."
+            if rejected["count"] or rejected["errors"]:
+                message += f"\nRejected {rejected['count']} invalid records:\n" + "\n".join(rejected["errors"])
+            done("Import Complete", message, error=bool(rejected["errors"]) and not stats["imported"])
+
+        busy(True, f"Importing {dataset}…")
+        self.root.after(1, step)
+
+    def _import_catalog_batch(self, dataset, records, stats):
+        """Insert menu or inventory records, replacing any existing record with the same id"""
+        if dataset == "menu":
+            for record in records:
+                self.menu_items.put(record)
+        else:
+            positions = {item.get("id"): i for i, item in enumerate(self.inventory)}
+            movements = []
+            for record in records:
+                if record["id"] in positions:
+                    old_quantity = float(self.inventory[positions[record["id"]]].get("quantity", 0))
+                    self.inventory[positions[record["id"]]] = record
+                else:
+                    old_quantity = 0.0
+                    positions[record["id"]] = len(self.inventory)
+                    self.inventory.append(record)
+                delta = record["quantity"] - old_quantity
+                movements.append((record["id"], "receipt" if delta > 0 else "adjust", delta, "import"))
+            self.record_stock(movements)
+            self.ensure_inventory_fields()
+            self.recipe_book.invalidate()
+        for record in records:
+            self.store.upsert(dataset, record)
+        self.data_versions[dataset] += 1
+        self.store.commit()
+        if dataset == "inventory":
+            for record in records:
+                self.bus.publish("inventory_changed", record=record)
+        stats["imported"] += len(records)
+
+    def _import_order_batch(self, orders, known_ids, stats, closed):
+        """Add orders not seen before: the live month goes to the store, closed months are collected in `closed`"""
+        recipes = self.compiled_recipes()
+        for order in orders:
+            if order["id"] in known_ids:
+                stats["skipped"] += 1
+                continue
+            known_ids.add(order["id"])
+            month = order["datetime"][:7]
+            if month < self.live_month:
+                closed.setdefault(month, []).append(order)
+            else:
+                self.store.append_order(order)
+                self.order_index.add(order)
+            self.rollups.apply_order(order, recipes)
+            stats["imported"] += 1
+        self.data_versions["orders"] += 1
+        self.store.write_file(ROLLUPS_FILE, self.rollups.snapshot)
+        self.store.commit()
+
+    def _refresh_after_import(self, dataset):
+        if dataset == "menu":
+            self.refresh_menu()
+            self.refresh_available_menu()
+        elif dataset == "inventory":
+            self.refresh_inventory()
+        else:
+            self.bus.publish("orders_reloaded")
+        self.refresh_reports()
 
     def ensure_inventory_fields(self):
+        migrated = []
         for item in self.inventory:
             for field in INVENTORY_FIELDS:
                 if field not in item:
@@ -1261,6 +4802,14 @@ class CanteenManagementSystem:
                     else:
                         item[field] = ""
             item["total_value"] = float(item.get("quantity", 0)) * float(item.get("unit_price", 0))
+            if "lots" not in item:
+                ensure_lots(item)
+                migrated.append(item)
+        # Write the lots of records from before lot tracking back once
+        if migrated:
+            for item in migrated:
+                self.store.upsert("inventory", item)
+            self.store.commit()
 
     # --- INVENTORY TAB ---
     def setup_inventory_tab(self):
@@ -1276,6 +4825,7 @@ class CanteenManagementSystem:
             ("Add Item", self.add_inventory_item, "success"),
             ("Edit Item", self.edit_inventory_item, "warning"),
             ("Delete Item", self.delete_inventory_item, "danger"),
+            ("Write Off Expired", self.write_off_expired, "dark"),
             ("Refresh", self.refresh_inventory, "secondary")
         ]
         for i, (text, command, style) in enumerate(actions):
@@ -1283,37 +4833,68 @@ class CanteenManagementSystem:
             btn.grid(row=0, column=i, padx=5, pady=5, sticky="ew")
             btn_frame.grid_columnconfigure(i, weight=1)
 
-        # Inventory table
-        table_frame = tb.Frame(frame, bootstyle="light")
-        table_frame.pack(fill="both", expand=True, padx=20, pady=10)
-        columns = INVENTORY_FIELDS
-        self.inventory_tree = tb.Treeview(table_frame, columns=columns, show="headings", height=15, bootstyle="info")
-        for col in columns:
-            self.inventory_tree.heading(col, text=col.replace("_", " ").title())
-            self.inventory_tree.column(col, width=110, anchor="center")
-        tree_vscroll = tb.Scrollbar(table_frame, orient="vertical", command=self.inventory_tree.yview, bootstyle="primary-round")
-        tree_hscroll = tb.Scrollbar(table_frame, orient="horizontal", command=self.inventory_tree.xview, bootstyle="primary-round")
-        self.inventory_tree.configure(yscrollcommand=tree_vscroll.set, xscrollcommand=tree_hscroll.set)
-        self.inventory_tree.grid(row=0, column=0, sticky="nsew")
-        tree_vscroll.grid(row=0, column=1, sticky="ns")
-        tree_hscroll.grid(row=1, column=0, sticky="ew")
-        table_frame.grid_rowconfigure(0, weight=1)
-        table_frame.grid_columnconfigure(0, weight=1)
+        # Filter bar, answered from the inventory index
+        filter_frame = tb.Frame(frame, bootstyle="light")
+        filter_frame.pack(fill="x", padx=20, pady=(0, 5))
+        self.inventory_filter_vars = {}
+        for column, label in (("category", "Category"), ("supplier_name", "Supplier"), ("status", "Status")):
+            tb.Label(filter_frame, text=label + ":", bootstyle="primary").pack(side="left", padx=(5, 2))
+            var = tk.StringVar(value="All")
+            combo = tb.Combobox(filter_frame, textvariable=var, state="readonly", width=14, bootstyle="primary")
+            combo.configure(postcommand=lambda c=combo, col=column: c.configure(
+                values=["All"] + self.inventory_index.values(col)))
+            combo.bind("<<ComboboxSelected>>", lambda e: self.apply_inventory_filters())
+            combo.pack(side="left")
+            self.inventory_filter_vars[column] = var
+        self.below_threshold_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(filter_frame, text="Below threshold", variable=self.below_threshold_var,
+                       command=self.apply_inventory_filters, bootstyle="danger-round-toggle").pack(side="left", padx=10)
+        tb.Label(filter_frame, text="Expiring within", bootstyle="primary").pack(side="left", padx=(5, 2))
+        self.expiring_days_var = tk.StringVar()
+        days_entry = tb.Spinbox(filter_frame, from_=0, to=365, width=5, textvariable=self.expiring_days_var,
+                                command=self.apply_inventory_filters, bootstyle="primary")
+        days_entry.bind("<KeyRelease>", lambda e: self.apply_inventory_filters())
+        days_entry.pack(side="left")
+        tb.Label(filter_frame, text="days", bootstyle="primary").pack(side="left", padx=(2, 5))
+        AnimatedButton(filter_frame, text="Clear Filters", bootstyle="secondary", command=self.clear_inventory_filters,
+                       cursor="hand2").pack(side="right")
+
+        # Inventory table: only the rows in view are in the Treeview
+        columns = [(col, col.replace("_", " ").title()) for col in INVENTORY_FIELDS]
+        self.inventory_table = VirtualTable(frame, self.inventory_index, columns, height=15, width=110,
+                                            striped=True, bootstyle="light")
+        self.inventory_table.pack(fill="both", expand=True, padx=20, pady=10)
+        self.inventory_tree = self.inventory_table.tree
+        self.inventory_tree.tag_configure("lowstock", foreground="red", background="#ffeaea")
         self.refresh_inventory()
 
     def refresh_inventory(self):
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        for idx, item in enumerate(self.inventory):
-            values = [item.get(col, "") for col in INVENTORY_FIELDS]
-            tag = "even" if idx % 2 == 0 else "odd"
-            color_tag = ""
-            if item.get("status", "") == "Low Stock" or float(item.get("quantity", 0)) < float(item.get("threshold", 0)):
-                color_tag = "lowstock"
-            self.inventory_tree.insert("", "end", values=values, tags=(tag, color_tag))
-        self.inventory_tree.tag_configure("even", background="#f7f7f7")
-        self.inventory_tree.tag_configure("odd", background="#e3eafc")
-        self.inventory_tree.tag_configure("lowstock", foreground="red", background="#ffeaea")
+        self.inventory_table.refresh()
+
+    def _inventory_row(self, item):
+        return [item.get(col, "") for col in INVENTORY_FIELDS], ("lowstock",) if is_low_stock(item) else ()
+
+    def _inventory_index_changed(self, record=None, deleted_id=None):
+        if deleted_id is not None:
+            self.inventory_index.remove(deleted_id)
+        if record is not None:
+            self.inventory_index.update(record)
+
+    def apply_inventory_filters(self):
+        filters = {column: var.get() for column, var in self.inventory_filter_vars.items() if var.get() != "All"}
+        filters["below_threshold"] = self.below_threshold_var.get()
+        days = self.expiring_days_var.get().strip()
+        filters["expiring_days"] = int(days) if days.isdigit() else None
+        self.inventory_index.filters = filters
+        self.inventory_table.offset = 0
+        self.inventory_table.refresh()
+
+    def clear_inventory_filters(self):
+        for var in self.inventory_filter_vars.values():
+            var.set("All")
+        self.below_threshold_var.set(False)
+        self.expiring_days_var.set("")
+        self.apply_inventory_filters()
 
     def add_inventory_item(self):
         add_window = tb.Toplevel(self.root)
@@ -1390,10 +4971,14 @@ class CanteenManagementSystem:
                     "unit_price": float(entries["unit_price_(selling)"].get()),
                     "total_value": float(entries["quantity"].get()) * float(entries["unit_price_(selling)"].get()),
                     "status": "Available",
-                    "remarks": entries["remarks"].get()
+                    "remarks": entries["remarks"].get(),
+                    "lots": []
                 }
+                item["lots"] = add_lot(item, item["quantity"], item["expiry_date"]) if item["quantity"] else []
+                sync_lots(item)
                 self.inventory.append(item)
-                self.save_data("inventory.json", self.inventory)
+                self.persist("inventory", item)
+                self.log_stock(item["id"], 0, item["quantity"], "added")
                 self.refresh_inventory()
                 add_window.destroy()
                 messagebox.showinfo("Success", "Inventory item added successfully!")
@@ -1473,21 +5058,33 @@ class CanteenManagementSystem:
 
         def update_item():
             try:
+                old_quantity = item.get("quantity", 0)
+                new_quantity = float(entries["quantity"].get())
+                expiry = normalize_date(entries["expiry_date"].get())
+                # A higher quantity is a new lot, a lower one comes off the oldest lots
+                if new_quantity > old_quantity:
+                    lots = add_lot(item, new_quantity - old_quantity, expiry)
+                elif new_quantity < old_quantity:
+                    lots, _ = consume_fefo(item["lots"], old_quantity - new_quantity)
+                elif len(item["lots"]) == 1:
+                    lots = [dict(item["lots"][0], expiry_date=expiry)]
+                else:
+                    lots = item["lots"]
                 item["name"] = entries["item_name"].get()
                 item["category"] = entries["category"].get()
                 item["unit"] = entries["unit"].get()
-                item["quantity"] = float(entries["quantity"].get())
                 item["threshold"] = float(entries["threshold"].get())
-                item["expiry_date"] = entries["expiry_date"].get()
                 item["supplier_name"] = entries["supplier_name"].get()
                 item["supplier_contact"] = entries["supplier_contact"].get()
                 item["supplier_price"] = float(entries["cost_price"].get())
                 item["unit_price"] = float(entries["unit_price_(selling)"].get())
-                item["total_value"] = float(entries["quantity"].get()) * float(entries["unit_price_(selling)"].get())
                 item["remarks"] = entries["remarks"].get()
                 item["last_restock"] = datetime.now().strftime("%Y-%m-%d")
+                item["lots"] = lots
+                sync_lots(item)
                 item["status"] = "Available" if item["quantity"] >= item["threshold"] else "Low Stock"
-                self.save_data("inventory.json", self.inventory)
+                self.persist("inventory", item)
+                self.log_stock(item["id"], old_quantity, item["quantity"], "edited")
                 self.refresh_inventory()
                 edit_window.destroy()
                 messagebox.showinfo("Success", "Inventory item updated successfully!")
@@ -1506,38 +5103,52 @@ class CanteenManagementSystem:
             return
         item_id = int(self.inventory_tree.item(selected[0])["values"][0])
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this item?"):
+            removed = [item for item in self.inventory if item.get("id", 0) == item_id]
             self.inventory = [item for item in self.inventory if item.get("id", 0) != item_id]
-            self.save_data("inventory.json", self.inventory)
+            self.persist("inventory", deleted_id=item_id)
+            for item in removed:
+                self.log_stock(item_id, item.get("quantity", 0), 0, "deleted")
             self.refresh_inventory()
             messagebox.showinfo("Success", "Inventory item deleted successfully!")
 
-    def refresh_inventory(self):
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        for idx, item in enumerate(self.inventory):
-            values = [item.get(col, "") for col in INVENTORY_FIELDS]
-            tag = "even" if idx % 2 == 0 else "odd"
-            color_tag = ""
-            if item.get("status", "") == "Low Stock" or float(item.get("quantity", 0)) < float(item.get("threshold", 0)):
-                color_tag = "lowstock"
-            self.inventory_tree.insert("", "end", values=values, tags=(tag, color_tag))
-        self.inventory_tree.tag_configure("even", background="#f7f7f7")
-        self.inventory_tree.tag_configure("odd", background="#e3eafc")
-        self.inventory_tree.tag_configure("lowstock", foreground="red", background="#ffeaea")
+    def write_off_expired(self):
+        """Take every expired lot out of stock and record it as waste"""
+        expired = self.expiry_index.expired()
+        if not expired:
+            messagebox.showinfo("Write Off", "No expired lots to write off.")
+            return
+        wasted = {}
+        for lot in expired:
+            wasted[lot["id"]] = wasted.get(lot["id"], 0) + lot["quantity"]
+        if not messagebox.askyesno("Confirm", f"Write off {len(expired)} expired lots of {len(wasted)} items?"):
+            return
+        positions = {item.get("id"): i for i, item in enumerate(self.inventory)}
+        movements = []
+        for item_id, quantity in wasted.items():
+            item = dict(self.inventory[positions[item_id]])
+            # expired lots are the first out, so consuming their total takes exactly them
+            item["lots"], _ = consume_fefo(item["lots"], quantity)
+            sync_lots(item)
+            item["status"] = "Available" if item["quantity"] >= float(item.get("threshold", 0)) else "Low Stock"
+            self.inventory[positions[item_id]] = item
+            self.persist("inventory", item)
+            movements.append((item_id, "waste", -quantity, "expired"))
+        self.record_stock(movements)
+        self.refresh_inventory()
+        messagebox.showinfo("Success", f"Wrote off {len(expired)} expired lots.")
 
     def refresh_available_menu(self):
-        for item in self.available_menu_tree.get_children():
-            self.available_menu_tree.delete(item)
-        for item in self.menu_items:
-            if item.get("available", False):
-                self.available_menu_tree.insert("", "end", values=(
-                    item.get("id", ""), item.get("name", ""), f"₹{item.get('price', 0):.2f}", item.get("category", "")
-                ))
-
-    def zoom_figure(self, fig, canvas, factor):
-        w, h = fig.get_size_inches()
-        fig.set_size_inches(w * factor, h * factor)
-        canvas.draw()
+        category = self.menu_category_var.get()
+        if category == "All":
+            items = self.menu_items.available_items()
+        else:
+            items = [item for item in self.menu_items.in_category(category) if item.get("available", False)]
+        self.available_menu_rows.update((item["id"], (
+            item.get("id", ""), item.get("name", ""), f"₹{item.get('price', 0):.2f}", item.get("category", "")
+        ), ()) for item in items)
+
+    def zoom_figure(self, chart, factor):
+        self.figure_pool.zoom(chart, factor)
 
 
 if __name__ == "__main__":
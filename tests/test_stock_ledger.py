@@ -0,0 +1,23 @@
+import canteen
+
+
+def test_torn_tail_is_cut_before_new_movements(tmp_path):
+    path = str(tmp_path / "stock_ledger.jsonl")
+    ledger = canteen.StockLedger(path)
+    ledger.record([(1, "receipt", 10.0, "opening")])
+    ledger.close()
+    with open(path, "a") as file:
+        file.write('{"ts": 1, "item": 1, "kind": "rec')  # crash mid-append
+
+    ledger = canteen.StockLedger(path)
+    assert ledger.load()
+    assert ledger.balance_at(1) == 10.0
+    ledger.record([(1, "receipt", 5.0, "delivery")])
+    ledger.write_pending()
+    ledger.record([(1, "receipt", 7.0, "delivery")])
+    ledger.close()
+
+    reloaded = canteen.StockLedger(path)
+    assert reloaded.load()
+    assert reloaded.balance_at(1) == 22.0
+    reloaded.close()
@@ -0,0 +1,41 @@
+import canteen
+
+
+class FlakyStore:
+    """Store whose commits fail until `broken` is cleared"""
+    def __init__(self):
+        self.broken = True
+        self.committed = []
+        self.current = []
+
+    def upsert(self, dataset, record):
+        self.current.append(record["id"])
+
+    def commit(self):
+        if self.broken:
+            raise OSError("disk full")
+        self.committed.extend(self.current)
+        self.current = []
+
+    def rollback(self):
+        self.current = []
+
+    def close(self):
+        pass
+
+
+def test_failed_writes_are_reported_and_retried():
+    store = FlakyStore()
+    writer = canteen.WriteBehindStore(store, window=0.01)
+    writer.upsert("menu", {"id": 1})
+    writer.commit()
+    assert not writer.flush(0.2)
+    assert isinstance(writer.last_error, OSError)
+    assert writer.failures >= 1
+
+    store.broken = False
+    assert writer.flush(5)
+    assert writer.last_error is None
+    assert writer.failures == 0
+    assert store.committed == [1]
+    writer.close()